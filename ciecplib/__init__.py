@@ -25,12 +25,16 @@ authentication systems.
 # request the contents of a URL
 from .requests import (
     get,
+    get_many,
     head,
     post,
 )
 
 # generate session handling
-from .sessions import Session
+from .sessions import (
+    Session,
+    SessionManager,
+)
 
 # user interfaces
 from .ui import (
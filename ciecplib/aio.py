@@ -0,0 +1,251 @@
+# Copyright (C) 2025 Cardiff University
+#
+# This file is part of ciecplib.
+#
+# ciecplib is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ciecplib is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ciecplib.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Asynchronous (`asyncio`) HTTP requests with end-to-end ECP authentication.
+
+The blocking network I/O is performed by :mod:`requests` in a bounded pool
+of threads, so any number of requests can be awaited at the same time
+without creating a thread per request.
+
+Requests can be cancelled, or given a deadline using `asyncio.wait_for`,
+in which case the underlying HTTP request is left to complete in the
+background and its response is discarded.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from . import requests as ciecplib_requests
+from .cookies import has_session_cookies
+from .env import _get_default_idp
+from .sessions import Session
+
+__author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
+
+__all__ = [
+    "AsyncSession",
+    "get",
+    "head",
+    "post",
+]
+
+#: Default number of threads used to perform blocking I/O
+DEFAULT_MAX_WORKERS = 10
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _default_executor():
+    """Return the shared executor used by the module-level functions."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=DEFAULT_MAX_WORKERS,
+                thread_name_prefix="ciecplib-aio",
+            )
+        return _EXECUTOR
+
+
+def _close_response(future):
+    """Close the response of a request that nobody is waiting for."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+async def _run(executor, func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` in ``executor`` and await the result."""
+    loop = asyncio.get_event_loop()  # get_running_loop() needs python3.7
+    future = executor.submit(partial(func, *args, **kwargs))
+    try:
+        return await asyncio.wrap_future(future, loop=loop)
+    except asyncio.CancelledError:
+        # don't leak the connection if the request completes anyway,
+        # the callback has to go on the executor future, the asyncio
+        # future has already been cancelled
+        future.add_done_callback(_close_response)
+        raise
+
+
+class AsyncSession:
+    """An `asyncio` wrapper around a `ciecplib.Session`.
+
+    All requests made with an `AsyncSession` share the cookies (and
+    connection pool) of a single `ciecplib.Session`, so ECP authentication
+    happens once, however many requests are in flight.
+
+    Parameters
+    ----------
+    idp, kerberos, username, password, cookiejar
+        see `ciecplib.Session`
+
+    max_workers : `int`, optional
+        the number of threads to use for blocking I/O
+
+    session : `ciecplib.Session`, optional
+        an existing session to wrap, if given all of the other
+        `ciecplib.Session` arguments are ignored, and the session is
+        not closed by `AsyncSession.close`
+
+    kwargs
+        other keyword arguments are passed to `ciecplib.Session`
+
+    Examples
+    --------
+    >>> async with AsyncSession(idp="LIGO", kerberos=True) as sess:
+    ...     responses = await asyncio.gather(*(sess.get(url) for url in urls))
+    """
+    def __init__(
+        self,
+        idp=_get_default_idp(),
+        kerberos=None,
+        username=None,
+        password=None,
+        cookiejar=None,
+        max_workers=DEFAULT_MAX_WORKERS,
+        session=None,
+        **kwargs,
+    ):
+        # only close sessions that we created
+        self._owns_session = session is None
+        if session is None:
+            session = Session(
+                idp=idp,
+                kerberos=kerberos,
+                username=username,
+                password=password,
+                cookiejar=cookiejar,
+                **kwargs,
+            )
+        self.session = session
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="ciecplib-aio",
+        )
+
+    @property
+    def cookies(self):
+        """The cookie jar shared by all requests in this session."""
+        return self.session.cookies
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close the underlying `ciecplib.Session`.
+
+        A ``session`` passed in when creating the `AsyncSession` is left
+        open, for the caller to close.
+        """
+        try:
+            if self._owns_session:
+                await _run(self._executor, self.session.close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def ecp_authenticate(self, url, **kwargs):
+        """Authenticate against the IdP for the given URL.
+
+        Authentication is skipped if the session already holds a session
+        cookie for ``url``.  Concurrent calls, and logins triggered by
+        `AsyncSession.request`, wait for any login in progress to
+        complete, so the ECP handshake is only performed once.
+
+        Parameters
+        ----------
+        url : `str`
+            the URL of the service that needs cookies
+
+        kwargs
+            other keyword arguments are passed to
+            :meth:`ciecplib.Session.ecp_authenticate`
+        """
+        await _run(self._executor, self._ecp_authenticate, url, **kwargs)
+
+    def _ecp_authenticate(self, url, **kwargs):
+        # use the same lock that serialises the logins triggered by
+        # requests made through the session
+        with self.session.auth._lock:
+            if not has_session_cookies(self.cookies, url):
+                self.session.ecp_authenticate(url, **kwargs)
+
+    async def request(self, method, url, **kwargs):
+        """Send a request, authenticating with ECP if required.
+
+        Parameters
+        ----------
+        method : `str`
+            the HTTP method to use
+
+        url : `str`
+            the URL to request
+
+        kwargs
+            other keyword arguments are passed to
+            :meth:`requests.Session.request`
+
+        Returns
+        -------
+        response : `requests.Response`
+            the response from the URL
+        """
+        return await _run(
+            self._executor,
+            self.session.request,
+            method,
+            url,
+            **kwargs,
+        )
+
+    async def get(self, url, **kwargs):
+        """Send a GET request, see `AsyncSession.request`."""
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        """Send a HEAD request, see `AsyncSession.request`."""
+        kwargs.setdefault("allow_redirects", False)
+        return await self.request("HEAD", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        """Send a POST request, see `AsyncSession.request`."""
+        return await self.request("POST", url, **kwargs)
+
+
+def _async_func_factory(method):
+    func = getattr(ciecplib_requests, method)
+
+    async def _func(url, **kwargs):
+        return await _run(_default_executor(), func, url, **kwargs)
+
+    _func.__name__ = _func.__qualname__ = method
+    _func.__doc__ = func.__doc__.replace(
+        "Send a ",
+        "Asynchronously send a ",
+        1,
+    )
+    return _func
+
+
+get = _async_func_factory("get")
+head = _async_func_factory("head")
+post = _async_func_factory("post")
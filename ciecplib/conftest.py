@@ -27,6 +27,23 @@ from cryptography.hazmat.primitives.serialization import Encoding
 
 import pytest
 
+from .sessions import DEFAULT_SESSION_MANAGER
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Redirect the ciecplib cache into a temporary directory."""
+    path = tmp_path / "cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(path))
+    return path / "ciecplib"
+
+
+@pytest.fixture(autouse=True)
+def session_manager():
+    """Discard any sessions pooled by the default `SessionManager`."""
+    yield DEFAULT_SESSION_MANAGER
+    DEFAULT_SESSION_MANAGER.clear()
+
 
 @pytest.fixture(scope="session")  # one per suite is fine
 def private_key():
@@ -17,39 +17,997 @@
 
 """Cookie handling for SAML ECP authentication."""
 
-from copy import deepcopy
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from copy import copy
 from functools import wraps
-from http.cookiejar import (LoadError, MozillaCookieJar)
+from http.cookiejar import (
+    MISSING_FILENAME_TEXT,
+    Cookie,
+    LoadError,
+    MozillaCookieJar,
+)
+try:
+    from http.cookiejar import (
+        HTTPONLY_ATTR,
+        HTTPONLY_PREFIX,
+        NETSCAPE_HEADER_TEXT,
+    )
+except ImportError:  # python < 3.10
+    HTTPONLY_ATTR = HTTPONLY_PREFIX = None
+    NETSCAPE_HEADER_TEXT = MozillaCookieJar.header
 from urllib.parse import urlparse
 
 from requests.cookies import RequestsCookieJar
 
+from .env import _get_session_lifetime
+
+try:
+    import fcntl
+except ImportError:  # not unix
+    fcntl = None
+
 __author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
 
+#: Default time (seconds) before the predicted expiry of a session
+#: cookie after which it is no longer considered reusable
+DEFAULT_SESSION_MARGIN = 300
+
+#: Minimum session lifetime (seconds) that will be learned from an
+#: expired session, this should be well above `DEFAULT_SESSION_MARGIN`
+MIN_SESSION_LIFETIME = 1800
+
+#: Prefix for comment lines in cookie files that hold ciecplib metadata
+METADATA_PREFIX = "# ciecplib-"
+
+
+# -- file locking -------------------------------------------------------------
+
+class _FileLock(object):
+    """State of the lock held by this process on a single cookie file."""
+    def __init__(self):
+        self.rlock = threading.RLock()
+        self.fd = None
+        self.count = 0
+        self.exclusive = False
+
+
+_FILE_LOCKS = {}
+_FILE_LOCKS_LOCK = threading.Lock()
+
+#: Default time (seconds) to wait for the lock on a cookie file
+DEFAULT_LOCK_TIMEOUT = 60
+
+
+def _open_lockfile(lockpath):
+    """Open (creating if needed) a lock file owned by the current user.
+
+    Returns `None` if the file can't be opened, is a symbolic link, or
+    belongs to somebody else (e.g. it was planted in a shared directory).
+    """
+    try:
+        fd = os.open(
+            lockpath,
+            os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0),
+            0o600,
+        )
+    except OSError:  # e.g. read-only directory, or a symlink
+        return None
+    if os.fstat(fd).st_uid != os.getuid():
+        os.close(fd)
+        warnings.warn(
+            f"not locking cookie file, '{lockpath}' is owned by "
+            "another user",
+        )
+        return None
+    return fd
+
+
+def _flock(fd, mode, lockpath, timeout):
+    """Take an flock, waiting no longer than ``timeout`` seconds."""
+    deadline = time.monotonic() + timeout
+    delay = .01
+    while True:
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"timed out after {timeout} seconds waiting for "
+                    f"the lock on '{lockpath}'",
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, .5)
+        else:
+            return
+
+
+@contextmanager
+def lock_cookiefile(path, shared=False, timeout=DEFAULT_LOCK_TIMEOUT):
+    """Hold an advisory lock on a cookie file.
+
+    The lock is taken with :func:`fcntl.flock` on a ``<path>.lock`` file
+    next to the cookie file, so that it survives the cookie file being
+    atomically replaced. The lock is reentrant within a process, with
+    an exclusive request upgrading a shared lock already held, and
+    threads in the same process take it in turn.
+
+    On platforms without :mod:`fcntl`, or if the lock file cannot be
+    created, is a symbolic link, or is owned by another user, this
+    function does nothing.
+
+    Parameters
+    ----------
+    path : `str`
+        path to the cookie file
+
+    shared : `bool`, optional
+        if `True` take a shared (read) lock, otherwise (default) take an
+        exclusive (write) lock
+
+    timeout : `float`, optional
+        the maximum number of seconds to wait for the lock
+
+    Raises
+    ------
+    TimeoutError
+        if the lock could not be taken within ``timeout`` seconds
+    """
+    if fcntl is None:
+        yield
+        return
+
+    lockpath = os.path.abspath(os.fspath(path)) + ".lock"
+    with _FILE_LOCKS_LOCK:
+        lock = _FILE_LOCKS.setdefault(lockpath, _FileLock())
+    mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+
+    with lock.rlock:
+        if lock.fd is None:
+            fd = _open_lockfile(lockpath)
+            if fd is not None:
+                try:
+                    _flock(fd, mode, lockpath, timeout)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                lock.fd = fd
+                lock.exclusive = not shared
+        elif not shared and not lock.exclusive:
+            _flock(lock.fd, fcntl.LOCK_EX, lockpath, timeout)
+            lock.exclusive = True
+
+        if lock.fd is None:  # couldn't lock
+            yield
+            return
+
+        lock.count += 1
+        try:
+            yield
+        finally:
+            lock.count -= 1
+            if not lock.count:
+                fcntl.flock(lock.fd, fcntl.LOCK_UN)
+                os.close(lock.fd)
+                lock.fd = None
+
 
 # -- cookie jar ---------------------------------------------------------------
 
+class _MetadataReader(object):
+    """Wrap a cookie file to parse ciecplib metadata as lines are read.
+
+    The metadata lines are comments, so are still passed on to (and
+    ignored by) the cookie file parser.
+    """
+    def __init__(self, file, jar):
+        self._file = file
+        self._jar = jar
+
+    def readline(self, *args):
+        line = self._file.readline(*args)
+        if line.startswith(METADATA_PREFIX):
+            self._jar._parse_metadata(line)
+        return line
+
+
 class ECPCookieJar(RequestsCookieJar, MozillaCookieJar):
-    """Custom cookie jar that stores cookies in the cURL format."""
+    """Custom cookie jar that stores cookies in the cURL format.
+
+    The jar records when each ``_shibsession_`` cookie was acquired, and
+    the lifetime of the sessions for each Service Provider domain,
+    so that session cookies can be replaced before they expire.
+    Both are stored as comment lines in the cookie file, which are
+    ignored by cURL and other cookie file readers.
+
+    Parameters
+    ----------
+    *args
+        positional arguments are passed to
+        `http.cookiejar.MozillaCookieJar`
+
+    max_cookies : `int`, optional
+        the maximum number of cookies to hold, the least-recently-set
+        cookies are evicted to make room for new ones
+
+    max_cookies_per_domain : `int`, optional
+        the maximum number of cookies to hold for any single domain
+
+    compact_interval : `float`, optional
+        the interval (seconds) after which expired cookies are removed
+        (see `~ECPCookieJar.compact`) the next time a cookie is set,
+        by default expired cookies are only removed by calling
+        `~ECPCookieJar.compact` directly
+
+    **kwargs
+        other keyword arguments are passed to
+        `http.cookiejar.MozillaCookieJar`
+    """
+
+    def __init__(
+            self,
+            *args,
+            max_cookies=None,
+            max_cookies_per_domain=None,
+            compact_interval=None,
+            **kwargs,
+    ):
+        self.max_cookies = max_cookies
+        self.max_cookies_per_domain = max_cookies_per_domain
+        self.compact_interval = compact_interval
+        # order in which cookies were set (oldest first):
+        #     {(domain, path, name): None}
+        self._order = OrderedDict()
+        #     {domain: OrderedDict({(domain, path, name): None})}
+        self._domain_order = {}
+        # index of shibsession cookies:
+        #     {domain: OrderedDict({(path, name): cookie})}
+        # in the order in which they were set
+        self._session_cookies = {}
+        # acquisition times of shibsession cookies:
+        #     {(domain, path, name): timestamp}
+        self._acquired = {}
+        # session lifetimes: {domain: seconds}
+        self._lifetimes = {}
+        self._loading = False
+        self._last_compact = time.time()
+        self._stats = {
+            "evicted": 0,
+            "expired": 0,
+            "compactions": 0,
+        }
+        super().__init__(*args, **kwargs)
+
+    def set_cookie(self, cookie, *args, **kwargs):
+        with self._cookies_lock:
+            super().set_cookie(cookie, *args, **kwargs)
+            key = (cookie.domain, cookie.path, cookie.name)
+            self._order.pop(key, None)
+            self._order[key] = None
+            domain_order = self._domain_order.setdefault(
+                cookie.domain,
+                OrderedDict(),
+            )
+            domain_order.pop(key, None)
+            domain_order[key] = None
+            if cookie.name.startswith("_shibsession_"):
+                index = self._session_cookies.setdefault(
+                    cookie.domain,
+                    OrderedDict(),
+                )
+                index.pop(key[1:], None)
+                index[key[1:]] = cookie
+                if not self._loading:
+                    self._acquired[key] = time.time()
+            self._enforce_bounds(cookie.domain)
+
+    def clear(self, domain=None, path=None, name=None):
+        with self._cookies_lock:
+            if domain is None:
+                removed = None
+            else:
+                removed = [
+                    key for key in self._domain_order.get(domain, ())
+                    if (path is None or key[1] == path)
+                    and (name is None or key[2] == name)
+                ]
+            super().clear(domain=domain, path=path, name=name)
+            if removed is None:
+                self._order = OrderedDict()
+                self._domain_order = {}
+                self._session_cookies = {}
+                self._acquired = {}
+                return
+            domain_order = self._domain_order.get(domain, {})
+            index = self._session_cookies.get(domain, {})
+            for key in removed:
+                self._order.pop(key, None)
+                domain_order.pop(key, None)
+                index.pop(key[1:], None)
+                self._acquired.pop(key, None)
+            if not domain_order:
+                self._domain_order.pop(domain, None)
+            if not index:
+                self._session_cookies.pop(domain, None)
+
+    # -- garbage collection
+
+    def _evict(self, key):
+        """Remove a cookie to keep the jar within its bounds.
+
+        Eviction only bounds the memory used by this jar, so this doesn't
+        go through `clear`, which subclasses may use to delete cookies
+        from persistent storage.
+        """
+        ECPCookieJar.clear(self, *key)
+        self._stats["evicted"] += 1
+
+    @staticmethod
+    def _eviction_candidate(order):
+        """Return the key of the next cookie to evict from ``order``.
+
+        This is the least-recently-set cookie, except that session
+        cookies are only evicted when there is nothing else left, since
+        losing one means logging in again.
+        """
+        for key in order:
+            if not key[2].startswith("_shibsession_"):
+                return key
+        return next(iter(order))
+
+    def _enforce_bounds(self, domain):
+        """Evict the least-recently-set cookies if the jar is too big.
+
+        Session (``_shibsession_``) cookies are evicted last.
+
+        Also compacts the jar if ``compact_interval`` seconds have
+        passed since it was last compacted.
+        """
+        if (
+            self.compact_interval is not None
+            and time.time() - self._last_compact >= self.compact_interval
+        ):
+            self.compact()
+        if self.max_cookies_per_domain is not None:
+            domain_order = self._domain_order.get(domain, {})
+            while len(domain_order) > self.max_cookies_per_domain:
+                self._evict(self._eviction_candidate(domain_order))
+        if self.max_cookies is not None:
+            while len(self._order) > self.max_cookies:
+                self._evict(self._eviction_candidate(self._order))
+
+    def compact(self, now=None):
+        """Remove all expired cookies from this jar.
+
+        Parameters
+        ----------
+        now : `float`, optional
+            the Unix time against which to check expiry,
+            defaults to the current time
+
+        Returns
+        -------
+        nexpired : `int`
+            the number of cookies that were removed
+        """
+        if now is None:
+            now = time.time()
+        with self._cookies_lock:
+            expired = [
+                cookie for cookie in self
+                if cookie.is_expired(now)
+            ]
+            for cookie in expired:
+                self.clear(cookie.domain, cookie.path, cookie.name)
+            self._stats["expired"] += len(expired)
+            self._stats["compactions"] += 1
+            self._last_compact = time.time()
+        return len(expired)
+
+    def stats(self):
+        """Return the size of this jar and its garbage-collection counters.
+
+        Returns
+        -------
+        stats : `dict`
+            a `dict` with the following keys
+
+            - ``cookies``: the number of cookies in the jar
+            - ``domains``: the number of domains with cookies in the jar
+            - ``evicted``: the number of cookies removed to keep the jar
+              within ``max_cookies`` or ``max_cookies_per_domain``
+            - ``expired``: the number of expired cookies removed by
+              `~ECPCookieJar.compact`
+            - ``compactions``: the number of times the jar has been
+              compacted
+        """
+        with self._cookies_lock:
+            stats = {
+                "cookies": len(self._order),
+                "domains": len(self._domain_order),
+            }
+            stats.update(self._stats)
+        return stats
+
+    def update(self, other):
+        with self._cookies_lock:
+            super().update(other)
+            if not isinstance(other, ECPCookieJar):
+                return
+            # carry over the session metadata
+            for index in other._session_cookies.values():
+                for cookie in index.values():
+                    key = (cookie.domain, cookie.path, cookie.name)
+                    try:
+                        self._acquired[key] = other._acquired[key]
+                    except KeyError:  # acquisition time not known
+                        self._acquired.pop(key, None)
+            self._lifetimes.update(other._lifetimes)
+
+    # -- session lifetimes
+
+    def set_session_lifetime(self, domain, lifetime):
+        """Set the lifetime of Service Provider sessions for a domain.
+
+        Parameters
+        ----------
+        domain : `str`
+            the domain of the Service Provider
+
+        lifetime : `float`
+            the lifetime (seconds) of a new session
+        """
+        self._lifetimes[domain] = float(lifetime)
+
+    def session_lifetime(self, domain):
+        """Return the lifetime of Service Provider sessions for a domain.
+
+        If no lifetime has been configured or observed for ``domain``,
+        the default is taken from the ``ECP_SESSION_LIFETIME`` environment
+        variable.
+
+        Returns
+        -------
+        lifetime : `float`
+            the lifetime (seconds) of a new session
+        """
+        try:
+            return self._lifetimes[domain]
+        except KeyError:
+            return _get_session_lifetime()
+
+    def session_expiry(self, cookie):
+        """Return the predicted expiry time of a session cookie.
+
+        Parameters
+        ----------
+        cookie : `http.cookiejar.Cookie`
+            the ``_shibsession_`` cookie
+
+        Returns
+        -------
+        expiry : `float`, `None`
+            the predicted expiry as a Unix timestamp, or `None` if the
+            time at which the cookie was acquired is not known
+        """
+        try:
+            acquired = self._acquired[
+                (cookie.domain, cookie.path, cookie.name)
+            ]
+        except KeyError:
+            return None
+        return acquired + self.session_lifetime(cookie.domain)
+
+    def _session_expired(self, domain):
+        """Record that the session for a domain was found to have expired.
+
+        The age of the newest session cookie for the domain is used to
+        lower the estimate of the lifetime of sessions for that domain.
+        A session may have ended early (e.g. after a logout), so the
+        estimate is at most halved each time, and never goes below
+        `MIN_SESSION_LIFETIME`.
+        """
+        with self._cookies_lock:
+            cookie = self._find_session_cookie(domain)
+            if cookie is None:
+                return
+            key = (cookie.domain, cookie.path, cookie.name)
+            try:
+                age = time.time() - self._acquired[key]
+            except KeyError:
+                return
+            current = self.session_lifetime(domain)
+            lifetime = max(age, current / 2., MIN_SESSION_LIFETIME)
+            if lifetime < current:
+                self._lifetimes[domain] = lifetime
+
+    def _parse_metadata(self, line):
+        """Parse a line of ciecplib metadata from a cookie file."""
+        kind, *values = line[len(METADATA_PREFIX):].rstrip("\n").split("\t")
+        try:
+            if kind == "acquired":
+                domain, path, name, when = values
+                self._acquired[(domain, path, name)] = float(when)
+            elif kind == "lifetime":
+                domain, lifetime = values
+                self._lifetimes[domain] = float(lifetime)
+        except ValueError:  # malformed, just ignore it
+            pass
+
+    def _write_metadata(self, file, cookies):
+        """Write ciecplib metadata for some cookies to an open file."""
+        for cookie in cookies:
+            key = (cookie.domain, cookie.path, cookie.name)
+            if key in self._acquired:
+                file.write(f"{METADATA_PREFIX}acquired\t" + "\t".join(
+                    key + (repr(self._acquired[key]),),
+                ) + "\n")
+        for domain, lifetime in self._lifetimes.items():
+            file.write(
+                f"{METADATA_PREFIX}lifetime\t{domain}\t{lifetime!r}\n",
+            )
+
+    def _find_session_cookie(self, domain):
+        """Return the newest shibsession cookie for a domain, or `None`.
+        """
+        with self._cookies_lock:
+            index = self._session_cookies.get(domain)
+            if index:
+                for cookie in reversed(index.values()):
+                    if cookie.expires is None:
+                        return cookie
+        return None
+
+    def __iter__(self):
+        # iterate over a snapshot, so that other threads can safely
+        # add or remove cookies at the same time
+        with self._cookies_lock:
+            return iter(list(super().__iter__()))
 
     @wraps(MozillaCookieJar.save)
-    def save(self, *args, **kwargs):
-        copy = deepcopy(self)
-        for cookie in copy:
-            if cookie.expires is None:
-                # hack the cookie to store 0 so that cURL will use it
-                cookie.expires = "0"
-        # now save our modified cookiejar
-        return super(ECPCookieJar, copy).save(*args, **kwargs)
-
-    def _really_load(self, *args, **kwargs):
-        out = super()._really_load(*args, **kwargs)
+    def save(self, filename=None, ignore_discard=False, ignore_expires=False):
+        if filename is None:
+            if self.filename is None:
+                raise ValueError(MISSING_FILENAME_TEXT)
+            filename = self.filename
+        filename = os.fspath(filename)
+
+        # write the cookies to a temporary file and move it into place,
+        # so that readers never see a partial file
+        with lock_cookiefile(filename):
+            fd, tmp = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(filename)),
+                prefix=f".{os.path.basename(filename)}.",
+            )
+            try:
+                with os.fdopen(fd, "w") as file:
+                    self._write_cookies(file, ignore_discard, ignore_expires)
+                os.replace(tmp, filename)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            finally:
+                _uncache_cookiejar(filename)
+
+    @wraps(MozillaCookieJar.revert)
+    def revert(
+            self,
+            filename=None,
+            ignore_discard=False,
+            ignore_expires=False,
+    ):
+        # FileCookieJar.revert replaces self._cookies directly, which
+        # would leave the ordering and session cookie indexes stale
+        with self._cookies_lock:
+            cookies = list(self)
+            acquired = self._acquired
+            ECPCookieJar.clear(self)
+            try:
+                self.load(filename, ignore_discard, ignore_expires)
+            except OSError:
+                ECPCookieJar.clear(self)
+                self._loading = True
+                try:
+                    for cookie in cookies:
+                        self.set_cookie(cookie)
+                finally:
+                    self._loading = False
+                self._acquired = acquired
+                raise
+
+    def _write_cookies(self, file, ignore_discard, ignore_expires):
+        """Write cookies to an open file in the Netscape (cURL) format.
+
+        This matches :meth:`http.cookiejar.MozillaCookieJar.save`, except
+        that session cookies (with no expiry time) are written with an
+        expiry of ``0`` so that cURL will use them.
+        """
+        file.write(NETSCAPE_HEADER_TEXT)
+        now = time.time()
+        sessions = []
         for cookie in self:
-            if not cookie.expires:  # reformat "0" as None
-                cookie.expires = None
+            if not ignore_discard and cookie.discard:
+                continue
+            if not ignore_expires and cookie.is_expired(now):
+                continue
+            if cookie.name.startswith("_shibsession_"):
+                sessions.append(cookie)
+            domain = cookie.domain
+            if cookie.value is None:
+                # cookies.txt regards 'Set-Cookie: foo' as a cookie
+                # with no name, whereas http.cookiejar regards it as a
+                # cookie with no value.
+                name = ""
+                value = cookie.name
+            else:
+                name = cookie.name
+                value = cookie.value
+            if HTTPONLY_ATTR and cookie.has_nonstandard_attr(HTTPONLY_ATTR):
+                domain = HTTPONLY_PREFIX + domain
+            file.write("\t".join((
+                domain,
+                "TRUE" if cookie.domain.startswith(".") else "FALSE",
+                cookie.path,
+                "TRUE" if cookie.secure else "FALSE",
+                "0" if cookie.expires is None else str(cookie.expires),
+                name,
+                value,
+            )) + "\n")
+        self._write_metadata(file, sessions)
+
+    def _really_load(self, f, *args, **kwargs):
+        with self._cookies_lock:
+            self._loading = True
+            try:
+                out = super()._really_load(
+                    _MetadataReader(f, self),
+                    *args,
+                    **kwargs,
+                )
+            finally:
+                self._loading = False
+            for cookie in self:
+                if not cookie.expires:  # reformat "0" as None
+                    cookie.expires = None
         return out
 
 
+class SqliteECPCookieJar(ECPCookieJar):
+    """An `ECPCookieJar` that stores cookies in an SQLite database.
+
+    Unlike the cURL-format text file used by `ECPCookieJar`, the database
+    can be shared safely by many processes: `~SqliteECPCookieJar.save`
+    only writes the cookies that have been set (or removed) since the
+    jar was last loaded or saved, and lookups of session cookies that
+    aren't in memory are answered from the database.
+
+    Use :meth:`~SqliteECPCookieJar.export` to write the cookies to a
+    cURL-format cookie file (e.g. for use with ``ecp-curl`` or ``curl``).
+    """
+    #: Name of the database table holding the cookies
+    TABLE = "cookies"
+
+    _COLUMNS = (
+        "domain",
+        "path",
+        "name",
+        "value",
+        "version",
+        "port",
+        "port_specified",
+        "domain_specified",
+        "domain_initial_dot",
+        "path_specified",
+        "secure",
+        "expires",
+        "discard",
+        "comment",
+        "comment_url",
+        "rest",
+        "rfc2109",
+        "creation_time",
+    )
+
+    _SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    domain TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    version INTEGER,
+    port TEXT,
+    port_specified INTEGER NOT NULL,
+    domain_specified INTEGER NOT NULL,
+    domain_initial_dot INTEGER NOT NULL,
+    path_specified INTEGER NOT NULL,
+    secure INTEGER NOT NULL,
+    expires INTEGER,
+    discard INTEGER NOT NULL,
+    comment TEXT,
+    comment_url TEXT,
+    rest TEXT NOT NULL,
+    rfc2109 INTEGER NOT NULL,
+    creation_time REAL NOT NULL,
+    PRIMARY KEY (domain, path, name)
+);
+CREATE INDEX IF NOT EXISTS {TABLE}_domain_name ON {TABLE} (domain, name);
+CREATE TABLE IF NOT EXISTS lifetimes (
+    domain TEXT PRIMARY KEY,
+    lifetime REAL NOT NULL
+);
+"""
+
+    # databases whose schema has been set up: {(path, inode)}
+    _initialised = set()
+
+    def __init__(self, *args, **kwargs):
+        # cookies to write on the next save: {(domain, path, name): cookie}
+        self._dirty = {}
+        # cookies to delete on the next save: {(domain, path, name)}
+        self._deleted = set()
+        self._creation_times = {}
+        super().__init__(*args, **kwargs)
+
+    # -- database utilities
+
+    def _connect(self, filename):
+        """Open a connection to the database, creating it if needed.
+
+        The schema is only set up the first time that each database
+        file is opened by this process.
+        """
+        path = os.path.abspath(os.fspath(filename))
+        try:
+            inode = os.stat(path).st_ino
+        except OSError:  # no database yet
+            inode = None
+        conn = sqlite3.connect(path, timeout=60)
+        if inode is None or (path, inode) not in self._initialised:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self._SCHEMA)
+            self._initialised.add((path, os.stat(path).st_ino))
+        return conn
+
+    @staticmethod
+    def _key(cookie):
+        return (cookie.domain, cookie.path, cookie.name)
+
+    def _to_row(self, cookie):
+        key = self._key(cookie)
+        return (
+            cookie.domain,
+            cookie.path,
+            cookie.name,
+            cookie.value,
+            cookie.version,
+            cookie.port,
+            cookie.port_specified,
+            cookie.domain_specified,
+            cookie.domain_initial_dot,
+            cookie.path_specified,
+            cookie.secure,
+            cookie.expires,
+            cookie.discard,
+            cookie.comment,
+            cookie.comment_url,
+            json.dumps(cookie._rest),
+            cookie.rfc2109,
+            self._creation_times.get(key, time.time()),
+        )
+
+    def _from_row(self, row):
+        row = dict(zip(self._COLUMNS, row))
+        creation_time = row.pop("creation_time")
+        row["rest"] = json.loads(row["rest"])
+        for attr in (
+            "port_specified",
+            "domain_specified",
+            "domain_initial_dot",
+            "path_specified",
+            "secure",
+            "discard",
+            "rfc2109",
+        ):
+            row[attr] = bool(row[attr])
+        cookie = Cookie(**row)
+        self._creation_times[self._key(cookie)] = creation_time
+        return cookie
+
+    def _add_cookie(self, cookie):
+        """Add a cookie to the jar without marking it for saving."""
+        super().set_cookie(cookie)
+        # use the creation time from the database as the acquisition time
+        key = self._key(cookie)
+        if key in self._acquired:
+            self._acquired[key] = self._creation_times[key]
+
+    # -- cookie jar API
+
+    def set_cookie(self, cookie, *args, **kwargs):
+        with self._cookies_lock:
+            super().set_cookie(cookie, *args, **kwargs)
+            key = self._key(cookie)
+            self._dirty[key] = cookie
+            self._deleted.discard(key)
+            self._creation_times[key] = time.time()
+
+    def clear(self, domain=None, path=None, name=None):
+        with self._cookies_lock:
+            keys = [
+                self._key(cookie) for cookie in self
+                if (
+                    (domain is None or cookie.domain == domain)
+                    and (path is None or cookie.path == path)
+                    and (name is None or cookie.name == name)
+                )
+            ]
+            super().clear(domain=domain, path=path, name=name)
+            for key in keys:
+                self._dirty.pop(key, None)
+                self._creation_times.pop(key, None)
+                self._deleted.add(key)
+
+    def _evict(self, key):
+        # leave the cookie in the database, where other processes may be
+        # using it, but still write it if it hasn't been saved yet
+        super()._evict(key)
+        if key not in self._dirty:
+            self._creation_times.pop(key, None)
+
+    def load(self, filename=None, ignore_discard=False, ignore_expires=False):
+        """Load cookies from an SQLite database.
+
+        Raises `OSError` if the database doesn't exist.
+        """
+        if filename is None:
+            if self.filename is None:
+                raise ValueError(MISSING_FILENAME_TEXT)
+            filename = self.filename
+        if not os.path.isfile(filename):
+            raise FileNotFoundError(f"no such file: '{filename}'")
+
+        now = time.time()
+        conn = self._connect(filename)
+        try:
+            rows = conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM {self.TABLE}",
+            ).fetchall()
+            lifetimes = conn.execute(
+                "SELECT domain, lifetime FROM lifetimes",
+            ).fetchall()
+        finally:
+            conn.close()
+
+        with self._cookies_lock:
+            self._lifetimes.update(lifetimes)
+            for row in rows:
+                cookie = self._from_row(row)
+                if not ignore_discard and cookie.discard:
+                    continue
+                if not ignore_expires and cookie.is_expired(now):
+                    continue
+                self._add_cookie(cookie)
+
+    def revert(
+            self,
+            filename=None,
+            ignore_discard=False,
+            ignore_expires=False,
+    ):
+        with self._cookies_lock:
+            cookies = list(self)
+            dirty = self._dirty
+            deleted = self._deleted
+            self.clear()
+            self._dirty = {}
+            self._deleted = set()
+            try:
+                self.load(filename, ignore_discard, ignore_expires)
+            except OSError:
+                for cookie in cookies:
+                    self._add_cookie(cookie)
+                self._dirty = dirty
+                self._deleted = deleted
+                raise
+
+    def save(self, filename=None, ignore_discard=False, ignore_expires=False):
+        """Save new and modified cookies to an SQLite database.
+
+        Only cookies that have been set or removed since the jar was
+        last loaded or saved are written, other rows in the database
+        (e.g. those written by other processes) are left alone.
+        """
+        if filename is None:
+            if self.filename is None:
+                raise ValueError(MISSING_FILENAME_TEXT)
+            filename = self.filename
+
+        now = time.time()
+        with self._cookies_lock:
+            rows = [
+                self._to_row(cookie) for cookie in self._dirty.values()
+                if (ignore_discard or not cookie.discard)
+                and (ignore_expires or not cookie.is_expired(now))
+            ]
+            deleted = list(self._deleted)
+
+            conn = self._connect(filename)
+            try:
+                with conn:  # one transaction
+                    conn.executemany(
+                        f"DELETE FROM {self.TABLE} "
+                        "WHERE domain = ? AND path = ? AND name = ?",
+                        deleted,
+                    )
+                    conn.executemany(
+                        f"INSERT OR REPLACE INTO {self.TABLE} "
+                        f"({', '.join(self._COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                        rows,
+                    )
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO lifetimes (domain, lifetime) "
+                        "VALUES (?, ?)",
+                        self._lifetimes.items(),
+                    )
+            finally:
+                conn.close()
+
+            self._dirty = {}
+            self._deleted = set()
+
+    def export(self, filename, ignore_discard=True, ignore_expires=True):
+        """Write the cookies to a cURL-format (Netscape) cookie file.
+
+        Parameters
+        ----------
+        filename : `str`
+            the path of the file to write
+
+        ignore_discard, ignore_expires : `bool`, optional
+            options to pass to :meth:`ECPCookieJar.save`,
+            both default to `True` in this usage
+        """
+        return super().save(
+            filename,
+            ignore_discard=ignore_discard,
+            ignore_expires=ignore_expires,
+        )
+
+    def _find_session_cookie(self, domain):
+        cookie = super()._find_session_cookie(domain)
+        if cookie is not None or self.filename is None:
+            return cookie
+
+        # look for a session cookie created by someone else
+        if not os.path.isfile(self.filename):
+            return None
+        conn = self._connect(self.filename)
+        try:
+            row = conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM {self.TABLE} "
+                "WHERE domain = ? AND name >= ? AND name < ? "
+                "AND expires IS NULL "
+                "ORDER BY creation_time DESC LIMIT 1",
+                (domain, "_shibsession_", "_shibsession`"),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        cookie = self._from_row(row)
+        with self._cookies_lock:
+            self._add_cookie(cookie)
+        return cookie
+
+
 # -- utilities ----------------------------------------------------------------
 
 def extract_session_cookie(jar, url):
@@ -74,19 +1032,24 @@ def extract_session_cookie(jar, url):
         if no appropriate cookie is found
     """
     url = urlparse(url).netloc
-    for cookie in list(jar)[::-1]:
-        if (
-                cookie.name.startswith("_shibsession_")
-                and cookie.domain == url
-                and cookie.expires is None
-        ):
+    if isinstance(jar, ECPCookieJar):
+        cookie = jar._find_session_cookie(url)
+        if cookie is not None:
             return cookie
+    else:
+        for cookie in list(jar)[::-1]:
+            if (
+                    cookie.name.startswith("_shibsession_")
+                    and cookie.domain == url
+                    and cookie.expires is None
+            ):
+                return cookie
     raise ValueError(
         "no shibsession cookie found for {!r}".format(url),
     )
 
 
-def has_session_cookies(jar, url):
+def has_session_cookies(jar, url, margin=DEFAULT_SESSION_MARGIN):
     """Return `True` if the given cookie jar has a session cookie we can use.
 
     Parameters
@@ -97,19 +1060,97 @@ def has_session_cookies(jar, url):
     url : `str`
         the URL of the service that needs cookies
 
+    margin : `float`, optional
+        the minimum number of seconds that should remain before the
+        predicted expiry of the session (see
+        :meth:`ECPCookieJar.session_expiry`)
+
     Returns
     -------
     can_reuse : `bool`
         `True` if any cookie in the jar is a non-expiring ``shibsession``
-        cookie for the given same domain as ``url``
+        cookie for the given same domain as ``url``, and (for an
+        `ECPCookieJar`) its session isn't predicted to expire within
+        ``margin`` seconds
     """
     try:
-        extract_session_cookie(jar, url)
+        cookie = extract_session_cookie(jar, url)
     except ValueError:
         return False
+    if isinstance(jar, ECPCookieJar):
+        expiry = jar.session_expiry(cookie)
+        if expiry is not None and expiry - margin <= time.time():
+            return False
     return True
 
 
+# cache of parsed cookie files:
+#     {(path, ignore_discard, ignore_expires): (identity, jar)}
+_COOKIEJAR_CACHE = OrderedDict()
+_COOKIEJAR_CACHE_SIZE = 8
+_COOKIEJAR_CACHE_LOCK = threading.Lock()
+
+
+def _file_identity(path):
+    """Return a tuple that changes whenever the file at ``path`` changes.
+    """
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _uncache_cookiejar(path):
+    """Remove all cached copies of the cookie file at ``path``."""
+    path = os.path.abspath(os.fspath(path))
+    with _COOKIEJAR_CACHE_LOCK:
+        for key in [key for key in _COOKIEJAR_CACHE if key[0] == path]:
+            _COOKIEJAR_CACHE.pop(key)
+
+
+def _copy_cookiejar(jar, ignore_expires=True):
+    """Return a new `ECPCookieJar` with copies of the cookies in ``jar``.
+    """
+    now = time.time()
+    new = ECPCookieJar(
+        max_cookies=jar.max_cookies,
+        max_cookies_per_domain=jar.max_cookies_per_domain,
+        compact_interval=jar.compact_interval,
+    )
+    copies = {}
+    with jar._cookies_lock:
+        # copy the cookie structure directly, rather than going through
+        # set_cookie() (and the cookie policy) for every cookie
+        for domain, paths in jar._cookies.items():
+            for path, names in paths.items():
+                for name, cookie in names.items():
+                    if not ignore_expires and cookie.is_expired(now):
+                        continue
+                    copies[id(cookie)] = copied = copy(cookie)
+                    new._cookies.setdefault(domain, {}).setdefault(
+                        path,
+                        {},
+                    )[name] = copied
+        for domain, index in jar._session_cookies.items():
+            new._session_cookies[domain] = OrderedDict(
+                (key, copies[id(cookie)])
+                for key, cookie in index.items()
+                if id(cookie) in copies
+            )
+        for key in jar._order:
+            try:
+                cookie = jar._cookies[key[0]][key[1]][key[2]]
+            except KeyError:
+                continue
+            if id(cookie) in copies:
+                new._order[key] = None
+                new._domain_order.setdefault(
+                    key[0],
+                    OrderedDict(),
+                )[key] = None
+        new._acquired = dict(jar._acquired)
+        new._lifetimes = dict(jar._lifetimes)
+    return new
+
+
 def load_cookiejar(
         cookiefile,
         strict=True,
@@ -118,6 +1159,10 @@ def load_cookiejar(
 ):
     """Load a cookie jar from a file.
 
+    Parsed files are cached in memory, and only re-read when the file
+    changes (its inode, modification time, or size are different),
+    each call returns a new jar that can be modified freely.
+
     Parameters
     ----------
     cookiefile : `str`
@@ -131,14 +1176,43 @@ def load_cookiejar(
         options to pass to :meth:`http.cookiejar.FileCookieJar.load`,
         both default to `True` in this usage.
     """
+    key = (
+        os.path.abspath(os.fspath(cookiefile)),
+        ignore_discard,
+        ignore_expires,
+    )
     cookiejar = ECPCookieJar()
     try:
-        cookiejar.load(
-            str(cookiefile),
-            ignore_discard=ignore_discard,
-            ignore_expires=ignore_expires,
-        )
+        with lock_cookiefile(cookiefile, shared=True):
+            identity = _file_identity(key[0])
+
+            # return a copy of the cached jar if the file hasn't changed
+            with _COOKIEJAR_CACHE_LOCK:
+                cached = _COOKIEJAR_CACHE.get(key)
+                if cached is not None and cached[0] == identity:
+                    _COOKIEJAR_CACHE.move_to_end(key)
+                    return _copy_cookiejar(cached[1], ignore_expires)
+
+            cookiejar.load(
+                str(cookiefile),
+                ignore_discard=ignore_discard,
+                ignore_expires=ignore_expires,
+            )
     except (LoadError, OSError):
         if strict:
             raise
+        return cookiejar
+
+    # cache a copy of the new jar, but only if the file didn't change
+    # while we were reading it (not everyone takes the lock)
+    try:
+        unchanged = _file_identity(key[0]) == identity
+    except OSError:
+        unchanged = False
+    if unchanged:
+        with _COOKIEJAR_CACHE_LOCK:
+            _COOKIEJAR_CACHE[key] = (identity, _copy_cookiejar(cookiejar))
+            _COOKIEJAR_CACHE.move_to_end(key)
+            while len(_COOKIEJAR_CACHE) > _COOKIEJAR_CACHE_SIZE:
+                _COOKIEJAR_CACHE.popitem(last=False)
     return cookiejar
@@ -23,6 +23,15 @@ settings for CIECP tools:
 ``ECP_IDP``
    the name or URL of the default ECP Identity Provider (IdP)
 
+``ECP_IDPLIST_CACHE_TTL``
+   the number of seconds for which a cached copy of the list of ECP
+   Identity Providers is used without checking for updates
+
+``ECP_SESSION_LIFETIME``
+   the number of seconds for which a Service Provider session cookie is
+   assumed to be valid, unless a lifetime has been configured or observed
+   for that Service Provider (default: 28800, the Shibboleth default)
+
 Defaults may also be parsed from the ``CIGETCERTOPTS`` environment
 variable to support legacy users of ``cigetcert``.
 """
@@ -59,4 +68,44 @@ def _get_default_idp():
         return _parse_cigetcertops().get("institution")
 
 
+def _get_idplist_cache_ttl(default=86400):
+    """Return the lifetime (seconds) of the cached IdP list.
+
+    Parameters
+    ----------
+    default : `float`, optional
+        the value to return if ``ECP_IDPLIST_CACHE_TTL`` is not set, or
+        cannot be parsed as a number
+
+    Returns
+    -------
+    ttl : `float`
+        the cache lifetime in seconds
+    """
+    try:
+        return float(os.environ["ECP_IDPLIST_CACHE_TTL"])
+    except (KeyError, ValueError):
+        return default
+
+
+def _get_session_lifetime(default=28800):
+    """Return the default lifetime (seconds) of an SP session cookie.
+
+    Parameters
+    ----------
+    default : `float`, optional
+        the value to return if ``ECP_SESSION_LIFETIME`` is not set, or
+        cannot be parsed as a number
+
+    Returns
+    -------
+    lifetime : `float`
+        the session lifetime in seconds
+    """
+    try:
+        return float(os.environ["ECP_SESSION_LIFETIME"])
+    except (KeyError, ValueError):
+        return default
+
+
 DEFAULT_IDP = _get_default_idp()
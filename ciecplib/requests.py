@@ -18,8 +18,16 @@
 """HTTP request method with end-to-end ECP authentication."""
 
 import sys
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait,
+)
 from functools import wraps
+from itertools import islice
 from textwrap import indent
+from urllib.parse import urlparse
 try:
     from contextlib import nullcontext
 except ImportError:  # python < 3.7
@@ -34,7 +42,10 @@ except ImportError:  # python < 3.7
             pass
 
 from .env import DEFAULT_IDP
-from .sessions import Session
+from .sessions import (
+    DEFAULT_SESSION_MANAGER,
+    Session,
+)
 
 __author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
 
@@ -42,24 +53,33 @@ __author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
 def _ecp_session(func):
     """Decorate a function to open a `requests_ecp.Session`.
 
-    If a `Session` is already open, this function returns an instance of
-    `contextlib.nullcontext` that should _only_ be used with the `with`
-    statement, not a real `Session` object. This is only to support chaining
-    this method reentrant with respect to setting/resetting debug logging
-    levels.
+    If a `Session` is already open, or one can be reused from the
+    `~ciecplib.sessions.DEFAULT_SESSION_MANAGER`, this function returns an
+    instance of `contextlib.nullcontext` that should _only_ be used with the
+    `with` statement, not a real `Session` object. This is only to support
+    chaining this method reentrant with respect to setting/resetting debug
+    logging levels.
+
+    With ``debug=True`` a new `Session` is always created, so that the
+    debug logging is reset when it is closed.
     """
     @wraps(func)
     def _wrapper(*args, **kwargs):
         sess = kwargs.pop("session", None)
         if sess is None:
-            sess = Session(
-                idp=kwargs.pop("endpoint", DEFAULT_IDP),
-                username=kwargs.pop("username", None),
-                password=kwargs.pop("password", None),
-                kerberos=kwargs.pop("kerberos", None),
-                cookiejar=kwargs.pop("cookiejar", None),
-                debug=kwargs.get("debug", False),
-            )
+            session_kw = {
+                "idp": kwargs.pop("endpoint", DEFAULT_IDP),
+                "username": kwargs.pop("username", None),
+                "password": kwargs.pop("password", None),
+                "kerberos": kwargs.pop("kerberos", None),
+                "cookiejar": kwargs.pop("cookiejar", None),
+            }
+            if kwargs.get("debug", False):
+                sess = Session(debug=True, **session_kw)
+            else:
+                sess = nullcontext(
+                    enter_result=DEFAULT_SESSION_MANAGER.get(**session_kw),
+                )
         else:
             sess = nullcontext(enter_result=sess)
         return func(*args, session=sess, **kwargs)
@@ -141,3 +161,105 @@ post = _session_func_factory(
     "post",
     "Send a POST request using ECP authentication."
 )
+
+
+@_ecp_session
+def get_many(
+    urls,
+    max_workers=10,
+    per_host_limit=None,
+    session=None,
+    **kwargs,
+):
+    """Send many GET requests concurrently using ECP authentication.
+
+    All requests share a single `Session` (and its connection pool), so
+    ECP authentication happens (at most) once, and requests are executed
+    in a pool of threads.
+
+    Results are yielded as the requests complete, and at most
+    ``2 * max_workers`` requests are in flight at any time, so ``urls``
+    can be an arbitrarily long iterable.
+
+    Parameters
+    ----------
+    urls : `iterable` of `str`
+        the URLs to request
+
+    max_workers : `int`, optional
+        the number of threads to use; to avoid discarding connections,
+        this should not be larger than the connection pool size of the
+        session (10 by default)
+
+    per_host_limit : `int`, optional
+        the maximum number of concurrent requests to any one host,
+        default is no limit
+
+    endpoint, username, password, kerberos, cookiejar, session
+        see `ciecplib.get`
+
+    kwargs
+        other keyword arguments are passed directly to
+        :meth:`requests.Session.get`
+
+    Yields
+    ------
+    url : `str`
+        the URL that was requested
+
+    response : `requests.Response`, `Exception`
+        the response from the URL, or the exception raised when
+        requesting it
+
+    Examples
+    --------
+    >>> for url, resp in get_many(urls, endpoint="LIGO", kerberos=True):
+    ...     if isinstance(resp, Exception):
+    ...         print(f"{url} failed: {resp}")
+    """
+    kwargs.pop("debug", None)  # not supported by requests functions
+
+    limits = {}
+    limits_lock = threading.Lock()
+
+    def _host_limit(url):
+        host = urlparse(url).netloc
+        with limits_lock:
+            try:
+                return limits[host]
+            except KeyError:
+                sem = limits[host] = threading.BoundedSemaphore(
+                    per_host_limit,
+                )
+                return sem
+
+    # the decorator guarantees us a session
+    with session as sess:
+        def _get(url):
+            if per_host_limit is None:
+                return sess.get(url, **kwargs)
+            with _host_limit(url):
+                return sess.get(url, **kwargs)
+
+        urls = iter(urls)
+        pending = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            def _submit(count):
+                for url in islice(urls, count):
+                    pending[pool.submit(_get, url)] = url
+
+            _submit(2 * max_workers)
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    _submit(len(done))
+                    for future in done:
+                        url = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as exc:
+                            result = exc
+                        yield url, result
+            finally:
+                for future in pending:
+                    future.cancel()
@@ -17,9 +17,18 @@
 
 """ECP-integated requests session."""
 
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from functools import wraps
+from urllib.parse import urlparse
 
-from requests_ecp import Session as ECPSession
+from requests_ecp import (
+    HTTPECPAuth,
+    Session as ECPSession,
+)
 
 from .cookies import ECPCookieJar
 from .env import _get_default_idp
@@ -36,9 +45,126 @@ from .utils import get_idp_url
 
 __all__ = [
     "Session",
+    "SessionManager",
 ]
 
 
+class _ECPAuth(HTTPECPAuth):
+    """`requests_ecp.HTTPECPAuth` with lazy IdP resolution and thread safety.
+
+    The ``idp`` can be given as an institution name, or a (partial) URL,
+    or `None` to use the realm of the active Kerberos credential; it is
+    resolved to the URL of an ECP endpoint (see `ciecplib.utils.get_idp_url`)
+    the first time that authentication is required, so that requests that
+    reuse valid session cookies never need to query the list of IdPs.
+
+    When attached to a `Session`, ECP authentication is single-flight
+    per Service Provider (SP): if many threads are redirected to the IdP
+    by the same SP at the same time, one of them authenticates while
+    the others wait, and then all of them replay their original request
+    with the new session cookies.
+    """
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        # number of logins completed for each SP: {netloc: int}
+        self._generations = {}
+        self._session = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def idp(self):
+        if self._idp_url is None:
+            idp = self._idp
+            if not idp and self.kerberos:
+                idp = krb5_realm(find_krb5_principal())
+            self._idp_url = get_idp_url(idp) if idp else None
+        return self._idp_url
+
+    @idp.setter
+    def idp(self, value):
+        self._idp = value
+        self._idp_url = None
+
+    # the upstream loop protection counter is per-request,
+    # so it has to be per-thread here
+    @property
+    def _num_ecp_auth(self):
+        return getattr(self._local, "num_ecp_auth", 0)
+
+    @_num_ecp_auth.setter
+    def _num_ecp_auth(self, value):
+        self._local.num_ecp_auth = value
+
+    def __call__(self, request):
+        # record which authentication 'generation' of its SP
+        # this request was sent in
+        self._local.generation = self._generations.get(
+            urlparse(request.url).netloc,
+            0,
+        )
+        return super().__call__(request)
+
+    def _authenticate_session(
+        self,
+        session,
+        endpoint=None,
+        url=None,
+        **kwargs,
+    ):
+        with self._lock:
+            out = super()._authenticate_session(
+                session,
+                endpoint=endpoint,
+                url=url,
+                **kwargs,
+            )
+            if url:
+                netloc = urlparse(url).netloc
+                self._generations[netloc] = (
+                    self._generations.get(netloc, 0) + 1
+                )
+        return out
+
+    def _authenticate_response(self, response, endpoint=None, **kwargs):
+        session = self._session() if self._session is not None else None
+        if session is None:
+            return super()._authenticate_response(
+                response,
+                endpoint=endpoint,
+                **kwargs,
+            )
+
+        response.raw.read()
+        response.raw.release_conn()
+
+        # authenticate, unless another thread already did so for this
+        # SP after this request was sent; authenticating through the
+        # session stores the new cookies before the lock is released
+        netloc = urlparse(response.url).netloc
+        generation = getattr(self._local, "generation", None)
+        with self._lock:
+            current = self._generations.get(netloc, 0)
+            if generation == current:
+                # the session (if any) has expired, so record its lifetime
+                if isinstance(session.cookies, ECPCookieJar):
+                    session.cookies._session_expired(netloc)
+                self._authenticate(
+                    session,
+                    endpoint=endpoint,
+                    url=response.url,
+                )
+                self._generations[netloc] = current + 1
+
+        # replay the original request with the new session cookies
+        request = response.request.copy()
+        request.headers.pop("Cookie", None)
+        request.prepare_cookies(session.cookies)
+        new = response.connection.send(request, **kwargs)
+        new.history.insert(0, response)
+        return new
+
+
 class Session(ECPSession):
     """`requests.Session` with default ECP auth and pre-populated cookies."""
 
@@ -55,8 +181,6 @@ class Session(ECPSession):
 
         if kerberos is None:
             kerberos = has_krb5_credential()
-        if kerberos and not idp:
-            idp = krb5_realm(find_krb5_principal())
         if not kerberos and not idp:
             raise ValueError(
                 "no Identity Provider (IdP) given, and no kerberos "
@@ -65,16 +189,28 @@ class Session(ECPSession):
             )
 
         # open session with ECP authentication
-        super().__init__(
-            idp=get_idp_url(idp) if idp else None,
+        super().__init__(**kwargs)
+
+        # the IdP endpoint URL is only resolved if/when we need to
+        # authenticate, which may be never if cookies are reused
+        self.auth = _ECPAuth(
+            idp,
             kerberos=kerberos,
             username=username,
             password=password,
-            **kwargs,
         )
+        self.auth._session = weakref.ref(self)
 
-        # load cookies from existing jar or file
-        self.cookies = ECPCookieJar()
+        # load cookies from existing jar or file,
+        # keeping the size bounds of an existing ECPCookieJar
+        if isinstance(cookiejar, ECPCookieJar):
+            self.cookies = ECPCookieJar(
+                max_cookies=cookiejar.max_cookies,
+                max_cookies_per_domain=cookiejar.max_cookies_per_domain,
+                compact_interval=cookiejar.compact_interval,
+            )
+        else:
+            self.cookies = ECPCookieJar()
         if cookiejar:
             self.cookies.update(cookiejar)
 
@@ -88,3 +224,219 @@ class Session(ECPSession):
         if self.debug:
             reset_logging()
         return super().close()
+
+
+# -- session reuse ------------------------------------------------------------
+
+# how long (seconds) to trust the principal of a credential cache that
+# can't be checked for changes (i.e. one that isn't a file)
+_KRB5_PRINCIPAL_TTL = 60.
+_KRB5_PRINCIPALS = {}
+_KRB5_PRINCIPALS_LOCK = threading.Lock()
+
+
+def _krb5_principal():
+    """Return the active Kerberos principal, or `None`."""
+    try:
+        return find_krb5_principal()
+    except RuntimeError:
+        return None
+
+
+def _krb5_ccache_identity():
+    """Return a cheap identifier for the state of the credential cache.
+
+    For file-based caches this changes whenever the cache is rewritten
+    (e.g. by ``kinit``), so the (expensive) principal lookup only needs
+    to be repeated when it does.
+    """
+    ccname = (
+        os.environ.get("KRB5CCNAME")
+        or f"FILE:/tmp/krb5cc_{os.getuid()}"
+    )
+    if ccname.startswith("FILE:") or ccname.startswith("/"):
+        try:
+            stat = os.stat(ccname.split(":", 1)[-1])
+        except OSError:  # no credential cache
+            return (ccname, None)
+        return (ccname, (stat.st_ino, stat.st_mtime_ns))
+    return (ccname, None)
+
+
+def _krb5_identity():
+    """Return the identity of the active Kerberos credential.
+
+    Returns
+    -------
+    identity : `tuple`
+        the credential cache name, and the principal of its credential
+        (or `None`)
+    """
+    ccname, state = ident = _krb5_ccache_identity()
+    now = time.monotonic()
+    with _KRB5_PRINCIPALS_LOCK:
+        try:
+            cached, principal, checked = _KRB5_PRINCIPALS[ccname]
+        except KeyError:
+            pass
+        else:
+            if cached == ident and (
+                state is not None
+                or now - checked < _KRB5_PRINCIPAL_TTL
+            ):
+                return ccname, principal
+    principal = _krb5_principal()
+    with _KRB5_PRINCIPALS_LOCK:
+        _KRB5_PRINCIPALS[ccname] = (ident, principal, now)
+    return ccname, principal
+
+
+def _close_adapters(adapters):
+    """Close the connection pools of a discarded session."""
+    for adapter in adapters:
+        adapter.close()
+
+
+class SessionManager:
+    """A process-wide pool of `Session` objects for reuse.
+
+    Sessions are keyed by the IdP, credentials, and Kerberos principal
+    used to create them, so that repeated requests with the same
+    parameters reuse the same authenticated session (and its connection
+    pool) rather than logging in again.
+
+    Sessions using an explicit cookie jar are not pooled, since the
+    contents of the jar may change at any time.
+
+    Sessions that are discarded (for being idle, or to respect
+    ``maxsize``) are not closed straight away, since another thread may
+    still be using them; their connection pools are closed once they
+    are no longer referenced.
+
+    Parameters
+    ----------
+    maxsize : `int`, optional
+        the maximum number of sessions to keep, when exceeded the least
+        recently used session is discarded
+
+    ttl : `float`, optional
+        the number of seconds for which a session may sit unused before
+        it is discarded
+
+    Examples
+    --------
+    >>> manager = SessionManager(maxsize=4, ttl=600)
+    >>> sess = manager.get(idp="LIGO", kerberos=True)
+    >>> manager.get(idp="LIGO", kerberos=True) is sess
+    True
+    """
+    def __init__(self, maxsize=8, ttl=3600.):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @staticmethod
+    def _key(idp, username, password, kerberos):
+        # kerberos=None means 'use kerberos if available', so the
+        # active credential is part of the key in that case too
+        if kerberos is False:
+            identity = None
+        else:
+            identity = _krb5_identity()
+        return (idp, username, password, kerberos, identity)
+
+    def _lookup(self, key, now):
+        """Return the stored session for ``key`` if it hasn't expired.
+
+        Must be called with the lock held.
+        """
+        try:
+            sess, last = self._sessions[key]
+        except KeyError:
+            return None
+        if now - last >= self.ttl:  # idle for too long
+            del self._sessions[key]
+            return None
+        self._sessions[key] = (sess, now)
+        self._sessions.move_to_end(key)
+        return sess
+
+    def _prune(self, now, keep=None):
+        """Discard expired sessions, then the least recently used.
+
+        The session stored under ``keep`` is never discarded.
+        """
+        for key, (_, last) in list(self._sessions.items()):
+            if key != keep and now - last >= self.ttl:
+                del self._sessions[key]
+        while len(self._sessions) > self.maxsize:
+            self._sessions.popitem(last=False)
+
+    def get(
+        self,
+        idp=_get_default_idp(),
+        username=None,
+        password=None,
+        kerberos=None,
+        cookiejar=None,
+    ):
+        """Return a `Session` for the given parameters.
+
+        An existing session is returned if one was created with the same
+        parameters and has not expired, otherwise a new `Session` is
+        created and stored for later reuse.
+
+        Parameters
+        ----------
+        idp, username, password, kerberos, cookiejar
+            see `Session`
+
+        Returns
+        -------
+        session : `Session`
+            the (possibly already authenticated) session
+        """
+        session_kw = {
+            "idp": idp,
+            "username": username,
+            "password": password,
+            "kerberos": kerberos,
+        }
+        if cookiejar is not None:
+            return Session(cookiejar=cookiejar, **session_kw)
+
+        key = self._key(idp, username, password, kerberos)
+        now = time.monotonic()
+        with self._lock:
+            sess = self._lookup(key, now)
+        if sess is not None:
+            return sess
+
+        # create the session without holding the lock, since that may
+        # need to probe for Kerberos credentials
+        new = Session(**session_kw)
+        weakref.finalize(new, _close_adapters, list(new.adapters.values()))
+        with self._lock:
+            # another thread may have got there first
+            sess = self._lookup(key, now)
+            if sess is None:
+                sess = new
+            self._sessions[key] = (sess, now)
+            self._prune(now, keep=key)
+        return sess
+
+    def clear(self):
+        """Close and discard all sessions."""
+        with self._lock:
+            sessions = [sess for sess, _ in self._sessions.values()]
+            self._sessions.clear()
+        for sess in sessions:
+            sess.close()
+
+
+#: The default `SessionManager` used by `ciecplib.get` (and friends)
+DEFAULT_SESSION_MANAGER = SessionManager()
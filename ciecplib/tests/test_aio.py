@@ -0,0 +1,130 @@
+# Copyright (C) 2025 Cardiff University
+#
+# This file is part of ciecplib.
+#
+# ciecplib is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ciecplib is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ciecplib.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for :mod:`ciecplib.aio`."""
+
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from .. import aio as ciecplib_aio
+
+__author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
+
+IDP = "https://test.example.com/SOAP/ECP"
+
+
+def _run_async(coro):
+    """Run a coroutine to completion (`asyncio.run` needs python3.7)."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_get(requests_mock):
+    requests_mock.get("https://test.example.com", content=b"HELLO")
+    resp = _run_async(ciecplib_aio.get(
+        "https://test.example.com",
+        endpoint=IDP,
+        kerberos=False,
+    ))
+    assert resp.text == "HELLO"
+
+
+def test_async_session_gather(requests_mock):
+    """Check that many concurrent requests share one session."""
+    urls = [f"https://test.example.com/{i}" for i in range(50)]
+    for i, url in enumerate(urls):
+        requests_mock.get(url, content=str(i).encode())
+
+    async def _main():
+        async with ciecplib_aio.AsyncSession(
+            idp=IDP,
+            kerberos=False,
+            max_workers=4,
+        ) as sess:
+            return await asyncio.gather(*(sess.get(url) for url in urls))
+
+    responses = _run_async(_main())
+    assert [resp.text for resp in responses] == [
+        str(i) for i in range(len(urls))
+    ]
+
+
+def test_async_session_ecp_authenticate():
+    """Check that concurrent authentication only happens once."""
+    def _authenticate(url, **kwargs):
+        sess.session.cookies.set(
+            "_shibsession_test",
+            "abc",
+            domain="test.example.com",
+        )
+
+    async def _main():
+        await asyncio.gather(*(
+            sess.ecp_authenticate("https://test.example.com/data")
+            for _ in range(10)
+        ))
+        await sess.close()
+
+    sess = ciecplib_aio.AsyncSession(idp=IDP, kerberos=False)
+    with mock.patch.object(
+        sess.session,
+        "ecp_authenticate",
+        side_effect=_authenticate,
+    ) as ecp_authenticate:
+        _run_async(_main())
+    ecp_authenticate.assert_called_once()
+
+
+def test_async_session_timeout_closes_response():
+    """Check that a response that nobody waits for is still closed."""
+    closed = threading.Event()
+    resp = mock.Mock(close=mock.Mock(side_effect=closed.set))
+
+    def _request(*args, **kwargs):
+        time.sleep(.3)
+        return resp
+
+    async def _main(sess):
+        try:
+            await asyncio.wait_for(sess.get("https://test.example.com"), .05)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("request didn't time out")
+
+    sess = ciecplib_aio.AsyncSession(idp=IDP, kerberos=False)
+    with mock.patch.object(sess.session, "request", side_effect=_request):
+        _run_async(_main(sess))
+        assert closed.wait(5)
+
+
+def test_async_session_close_external_session():
+    """Check that a session passed in by the caller isn't closed."""
+    session = ciecplib_aio.Session(idp=IDP, kerberos=False)
+
+    async def _main():
+        async with ciecplib_aio.AsyncSession(session=session):
+            pass
+
+    with mock.patch.object(session, "close") as close:
+        _run_async(_main())
+    close.assert_not_called()
@@ -17,12 +17,21 @@
 
 """Test suite for :mod:`ciecplib.cookies`."""
 
-from http.cookiejar import Cookie
+import os
+import threading
+from copy import (
+    copy,
+    deepcopy,
+)
+from http.cookiejar import (
+    Cookie,
+    MozillaCookieJar,
+)
 try:
     from http.cookiejar import NETSCAPE_HEADER_TEXT
 except ImportError:  # python < 3.10
-    from http.cookiejar import MozillaCookieJar
     NETSCAPE_HEADER_TEXT = MozillaCookieJar.header
+from unittest import mock
 
 import pytest
 
@@ -73,6 +82,40 @@ class TestECPCookieJar(object):
         jar.load(str(path))
         assert len(jar) == 0
 
+    def test_revert(self, tmp_path):
+        """Check that `revert` rebuilds the jar's indexes."""
+        url = "https://sp.test.com/"
+        jar = self.TEST_CLASS(tmp_path / "cookies", max_cookies=3)
+        jar.set("a", "1", domain="test.com")
+        jar.save(ignore_discard=True, ignore_expires=True)
+        jar.set("b", "2", domain="other.com")
+        jar.set_cookie(_cookie("_shibsession_abc", domain="sp.test.com"))
+        assert ciecplib_cookies.has_session_cookies(jar, url)
+
+        jar.revert(ignore_discard=True, ignore_expires=True)
+        assert dict(jar) == {"a": "1"}
+        assert jar.stats()["cookies"] == jar.stats()["domains"] == 1
+        # the session cookie index doesn't refer to reverted cookies
+        assert not ciecplib_cookies.has_session_cookies(jar, url)
+        with pytest.raises(ValueError):
+            ciecplib_cookies.extract_session_cookie(jar, url)
+
+        # the bounds are enforced against the real contents
+        jar.set("c", "3", domain="test.com")
+        jar.set("d", "4", domain="test.com")
+        assert dict(jar) == {"a": "1", "c": "3", "d": "4"}
+
+    def test_revert_error(self, tmp_path):
+        """Check that a failed `revert` leaves the jar unchanged."""
+        jar = self.TEST_CLASS(tmp_path / "missing", max_cookies=2)
+        jar.set("a", "1", domain="test.com")
+        with pytest.raises(OSError):
+            jar.revert()
+        assert dict(jar) == {"a": "1"}
+        assert jar.stats()["cookies"] == 1
+        jar.set("b", "2", domain="test.com")
+        assert dict(jar) == {"a": "1", "b": "2"}
+
     def test_save_ignore_discard(self, ecpcookiejar, tmp_path):
         path = tmp_path / "cookies"
         ecpcookiejar.save(path, ignore_discard=True, ignore_expires=True)
@@ -118,3 +161,476 @@ def test_load_cookiejar_error(tmp_path):
         ciecplib_cookies.load_cookiejar(tmp_path / "blah", strict=False),
         ciecplib_cookies.ECPCookieJar,
     )
+
+
+@pytest.mark.skipif(
+    ciecplib_cookies.fcntl is None,
+    reason="fcntl not available",
+)
+def test_lock_cookiefile(tmp_path):
+    """Check that `lock_cookiefile` holds an flock that other processes see.
+    """
+    fcntl = ciecplib_cookies.fcntl
+    path = tmp_path / "cookies"
+    lockpath = str(path) + ".lock"
+
+    def _can_lock(mode):
+        fd = os.open(lockpath, os.O_RDWR)
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        finally:
+            os.close(fd)
+        return True
+
+    with ciecplib_cookies.lock_cookiefile(path, shared=True):
+        assert _can_lock(fcntl.LOCK_SH)
+        assert not _can_lock(fcntl.LOCK_EX)
+        # exclusive re-entry upgrades the lock
+        with ciecplib_cookies.lock_cookiefile(path):
+            assert not _can_lock(fcntl.LOCK_SH)
+        # and is kept until the outermost lock is released
+        assert not _can_lock(fcntl.LOCK_SH)
+    assert _can_lock(fcntl.LOCK_EX)
+
+
+@pytest.mark.skipif(
+    ciecplib_cookies.fcntl is None,
+    reason="fcntl not available",
+)
+def test_lock_cookiefile_timeout(tmp_path):
+    """Check that `lock_cookiefile` doesn't wait forever for a lock."""
+    fcntl = ciecplib_cookies.fcntl
+    path = tmp_path / "cookies"
+    fd = os.open(str(path) + ".lock", os.O_RDWR | os.O_CREAT)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with pytest.raises(TimeoutError, match="waiting for the lock"):
+            with ciecplib_cookies.lock_cookiefile(path, timeout=.1):
+                pass
+    finally:
+        os.close(fd)
+
+
+@pytest.mark.skipif(
+    ciecplib_cookies.fcntl is None,
+    reason="fcntl not available",
+)
+def test_lock_cookiefile_untrusted(tmp_path):
+    """Check that `lock_cookiefile` ignores lock files it doesn't own."""
+    path = tmp_path / "cookies"
+    lockpath = tmp_path / "cookies.lock"
+
+    # a symlink planted by someone else isn't followed
+    target = tmp_path / "target"
+    lockpath.symlink_to(target)
+    with ciecplib_cookies.lock_cookiefile(path):
+        pass
+    assert not target.exists()
+    lockpath.unlink()
+
+    # and a lock file owned by another user isn't used
+    lockpath.touch()
+    with pytest.warns(UserWarning, match="owned by another user"):
+        with mock.patch("os.getuid", return_value=os.getuid() + 1):
+            with ciecplib_cookies.lock_cookiefile(path):
+                assert ciecplib_cookies._FILE_LOCKS[str(lockpath)].fd is None
+
+
+def test_save_atomic(ecpcookiejar, tmp_path):
+    """Check that `ECPCookieJar.save` replaces the file atomically."""
+    path = tmp_path / "cookies"
+    path.write_text("old")
+    inode = path.stat().st_ino
+    ecpcookiejar.save(path, ignore_discard=True, ignore_expires=True)
+    assert path.stat().st_ino != inode
+    assert path.read_text().startswith(NETSCAPE_HEADER_TEXT)
+    # no temporary files left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "cookies",
+        "cookies.lock",
+    ]
+
+
+def test_save_matches_mozilla(ecpcookiejar, sessioncookie, tmp_path):
+    """Check that `ECPCookieJar.save` matches `MozillaCookieJar.save`."""
+    # add a persistent cookie, and a cookie with no value
+    ecpcookiejar.set("persistent", "value", domain=".test.com", expires=1234)
+    ecpcookiejar.set("novalue", None, domain="test.com")
+
+    # save with ciecplib
+    path = tmp_path / "ecp"
+    ecpcookiejar.save(path, ignore_discard=True, ignore_expires=True)
+
+    # save with the standard library, hacking the session cookie expiry
+    jar = MozillaCookieJar()
+    for cookie in ecpcookiejar:
+        cookie = copy(cookie)
+        if cookie.expires is None:
+            cookie.expires = "0"
+        jar.set_cookie(cookie)
+    jar.save(tmp_path / "moz", ignore_discard=True, ignore_expires=True)
+
+    # ignoring the ciecplib metadata comments
+    assert "".join(
+        line for line in path.read_text().splitlines(keepends=True)
+        if not line.startswith(ciecplib_cookies.METADATA_PREFIX)
+    ) == (tmp_path / "moz").read_text()
+
+
+def test_session_cookie_index(ecpcookiejar, sessioncookie):
+    """Check that the shibsession cookie index follows changes to the jar.
+    """
+    url = "https://somewhere.test.com"
+    newer = copy(sessioncookie)
+    newer.name = "_shibsession_newer"
+    ecpcookiejar.set_cookie(newer)
+    assert ciecplib_cookies.extract_session_cookie(ecpcookiejar, url) is newer
+
+    # the newest cookie is found, even when re-set
+    ecpcookiejar.set_cookie(sessioncookie)
+    assert ciecplib_cookies.extract_session_cookie(
+        ecpcookiejar,
+        url,
+    ) is sessioncookie
+
+    # removing a cookie removes it from the index
+    ecpcookiejar.clear(sessioncookie.domain, "/", sessioncookie.name)
+    assert ciecplib_cookies.extract_session_cookie(ecpcookiejar, url) is newer
+
+    # and the index survives a copy
+    assert ciecplib_cookies.has_session_cookies(deepcopy(ecpcookiejar), url)
+
+    # clearing the whole jar clears the index
+    ecpcookiejar.clear()
+    assert not ciecplib_cookies.has_session_cookies(ecpcookiejar, url)
+
+
+def test_session_cookie_index_locked(ecpcookiejar, sessioncookie):
+    """Check that the shibsession cookie index is read under the jar lock.
+    """
+    result = []
+    finder = threading.Thread(target=lambda: result.append(
+        ecpcookiejar._find_session_cookie(sessioncookie.domain),
+    ))
+    with ecpcookiejar._cookies_lock:
+        finder.start()
+        finder.join(.2)
+        assert finder.is_alive()
+    finder.join()
+    assert result == [sessioncookie]
+
+
+def test_extract_session_cookie_other_jar(sessioncookie):
+    """Check that `extract_session_cookie` works with non-ECP jars."""
+    jar = MozillaCookieJar()
+    jar.set_cookie(sessioncookie)
+    assert ciecplib_cookies.extract_session_cookie(
+        jar,
+        "https://somewhere.test.com",
+    ) is sessioncookie
+
+
+def test_load_cookiejar_cache(ecpcookiejar, tmp_path):
+    """Check that `load_cookiejar` only parses files that have changed."""
+    path = tmp_path / "cookies"
+    ecpcookiejar.save(path, ignore_discard=True, ignore_expires=True)
+
+    with mock.patch.object(
+        ciecplib_cookies.ECPCookieJar,
+        "_really_load",
+        autospec=True,
+        side_effect=ciecplib_cookies.ECPCookieJar._really_load,
+    ) as really_load:
+        jar1 = ciecplib_cookies.load_cookiejar(path)
+        jar2 = ciecplib_cookies.load_cookiejar(path)
+        assert really_load.call_count == 1
+
+        # check that we get independent copies
+        assert jar1 == jar2 == ecpcookiejar
+        jar1.clear()
+        next(iter(jar2)).value = "changed"
+        assert ciecplib_cookies.load_cookiejar(path) == ecpcookiejar
+        assert really_load.call_count == 1
+
+        # check that changing the file forces a reload
+        ecpcookiejar.set("new", "cookie", domain="test.com")
+        ecpcookiejar.save(path, ignore_discard=True, ignore_expires=True)
+        jar3 = ciecplib_cookies.load_cookiejar(path)
+        assert really_load.call_count == 2
+        assert jar3["new"] == "cookie"
+
+
+class TestSqliteECPCookieJar(TestECPCookieJar):
+    TEST_CLASS = ciecplib_cookies.SqliteECPCookieJar
+
+    @pytest.fixture
+    def ecpcookiejar(self, sessioncookie):
+        jar = self.TEST_CLASS()
+        jar.set_cookie(sessioncookie)
+        return jar
+
+    def test_save_discard(self, ecpcookiejar, tmp_path):
+        path = tmp_path / "cookies"
+        ecpcookiejar.save(path)
+        jar = self.TEST_CLASS()
+        jar.load(str(path))
+        assert len(jar) == 0
+
+    def test_round_trip(self, ecpcookiejar, sessioncookie, tmp_path):
+        path = tmp_path / "cookies.sqlite"
+        ecpcookiejar.set("persistent", "value", domain=".test.com", expires=1)
+        ecpcookiejar.save(path, ignore_discard=True, ignore_expires=True)
+        jar = self.TEST_CLASS(path)
+        jar.load(ignore_discard=True, ignore_expires=True)
+        assert jar == ecpcookiejar
+        cookie = ciecplib_cookies.extract_session_cookie(
+            jar,
+            "https://somewhere.test.com",
+        )
+        assert vars(cookie) == vars(sessioncookie)
+
+    def test_save_incremental(self, ecpcookiejar, tmp_path):
+        """Check that two jars can update the same database."""
+        path = tmp_path / "cookies.sqlite"
+        ecpcookiejar.save(path, ignore_discard=True)
+
+        jar1 = self.TEST_CLASS(path)
+        jar1.load(ignore_discard=True)
+        jar2 = self.TEST_CLASS(path)
+        jar2.load(ignore_discard=True)
+        jar1.set("a", "1", domain="test.com")
+        jar2.set("b", "2", domain="test.com")
+        jar2.clear("somewhere.test.com")
+        jar1.save(ignore_discard=True)
+        jar2.save(ignore_discard=True)
+
+        jar = self.TEST_CLASS(path)
+        jar.load(ignore_discard=True)
+        assert dict(jar) == {"a": "1", "b": "2"}
+
+    def test_session_cookie_from_database(self, ecpcookiejar, tmp_path):
+        """Check that session cookies saved by others are found."""
+        path = tmp_path / "cookies.sqlite"
+        url = "https://somewhere.test.com"
+        jar = self.TEST_CLASS(path)
+        assert not ciecplib_cookies.has_session_cookies(jar, url)
+        ecpcookiejar.save(path, ignore_discard=True)
+        assert ciecplib_cookies.has_session_cookies(jar, url)
+
+    def test_evict_keeps_database_rows(self, tmp_path):
+        """Check that eviction doesn't delete cookies from the database."""
+        path = tmp_path / "cookies.sqlite"
+        jar = self.TEST_CLASS(path)
+        jar.set("a", "1", domain="test.com")
+        jar.save(ignore_discard=True)
+
+        bounded = self.TEST_CLASS(path, max_cookies=1)
+        bounded.load(ignore_discard=True)
+        bounded.set("b", "2", domain="test.com")
+        assert dict(bounded) == {"b": "2"}
+        bounded.save(ignore_discard=True)
+
+        jar = self.TEST_CLASS(path)
+        jar.load(ignore_discard=True)
+        assert dict(jar) == {"a": "1", "b": "2"}
+
+    def test_revert_bounded(self, tmp_path):
+        """Check that `revert` resets the jar's bookkeeping."""
+        path = tmp_path / "cookies.sqlite"
+        jar = self.TEST_CLASS(path, max_cookies=2)
+        jar.set("a", "1", domain="test.com")
+        jar.save(ignore_discard=True)
+        jar.set("b", "2", domain="test.com")
+        jar.revert(ignore_discard=True)
+        jar.set("c", "3", domain="test.com")
+        jar.set("d", "4", domain="test.com")
+        assert dict(jar) == {"c": "3", "d": "4"}
+        assert jar.stats()["cookies"] == 2
+
+    def test_connect_schema_once(self, tmp_path):
+        """Check that the database schema is only set up once."""
+        path = tmp_path / "cookies.sqlite"
+        jar = self.TEST_CLASS(path)
+        jar.save()
+        with mock.patch("sqlite3.connect") as connect:
+            jar._connect(path)
+        connect.return_value.executescript.assert_not_called()
+
+    def test_export(self, ecpcookiejar, tmp_path):
+        ecpcookiejar.export(tmp_path / "sqlite.txt")
+        ciecplib_cookies.ECPCookieJar.save(
+            ecpcookiejar,
+            tmp_path / "ecp.txt",
+            ignore_discard=True,
+            ignore_expires=True,
+        )
+        assert (
+            (tmp_path / "sqlite.txt").read_text()
+            == (tmp_path / "ecp.txt").read_text()
+        )
+        jar = ciecplib_cookies.load_cookiejar(tmp_path / "sqlite.txt")
+        assert jar == ecpcookiejar
+
+    def test_session_metadata(self, ecpcookiejar, sessioncookie, tmp_path):
+        path = tmp_path / "cookies.sqlite"
+        ecpcookiejar.set_session_lifetime("somewhere.test.com", 3600)
+        ecpcookiejar.save(path, ignore_discard=True)
+        jar = self.TEST_CLASS(path)
+        jar.load(ignore_discard=True)
+        assert jar.session_lifetime("somewhere.test.com") == 3600
+        assert jar.session_expiry(sessioncookie) == pytest.approx(
+            ecpcookiejar.session_expiry(sessioncookie),
+        )
+
+    def test_load_error(self, tmp_path):
+        with pytest.raises(OSError):
+            self.TEST_CLASS().load(tmp_path / "missing.sqlite")
+
+
+def test_session_metadata_round_trip(ecpcookiejar, sessioncookie, tmp_path):
+    """Check that session acquisition times and lifetimes are saved."""
+    ecpcookiejar.set_session_lifetime("somewhere.test.com", 3600)
+    path = tmp_path / "cookies"
+    ecpcookiejar.save(path, ignore_discard=True, ignore_expires=True)
+    jar = ciecplib_cookies.load_cookiejar(path)
+    assert jar.session_lifetime("somewhere.test.com") == 3600
+    assert jar.session_expiry(sessioncookie) == (
+        ecpcookiejar.session_expiry(sessioncookie)
+    )
+
+    # and that the metadata is carried by update()
+    jar2 = ciecplib_cookies.ECPCookieJar()
+    jar2.update(jar)
+    assert jar2.session_expiry(sessioncookie) == (
+        ecpcookiejar.session_expiry(sessioncookie)
+    )
+
+
+def test_session_expiry_unknown(sessioncookie, tmp_path):
+    """Check that cookies from files without metadata are reused."""
+    jar = MozillaCookieJar()
+    jar.set_cookie(sessioncookie)
+    path = tmp_path / "cookies"
+    jar.save(path, ignore_discard=True, ignore_expires=True)
+    jar = ciecplib_cookies.load_cookiejar(path)
+    assert jar.session_expiry(next(iter(jar))) is None
+    assert ciecplib_cookies.has_session_cookies(
+        jar,
+        "https://somewhere.test.com",
+    )
+
+
+@mock.patch.dict("os.environ", {"ECP_SESSION_LIFETIME": "1000"})
+@pytest.mark.parametrize(("age", "margin", "result"), [
+    (0, 300, True),
+    (600, 300, True),
+    (800, 300, False),
+    (800, 100, True),
+    (2000, 0, False),
+])
+def test_has_session_cookies_expiry(ecpcookiejar, age, margin, result):
+    """Check that `has_session_cookies` predicts session expiry."""
+    for key in ecpcookiejar._acquired:
+        ecpcookiejar._acquired[key] -= age
+    assert ciecplib_cookies.has_session_cookies(
+        ecpcookiejar,
+        "https://somewhere.test.com",
+        margin=margin,
+    ) is result
+
+
+@mock.patch.dict("os.environ", {"ECP_SESSION_LIFETIME": "10000"})
+@pytest.mark.parametrize(("age", "lifetime"), [
+    pytest.param(6000, 6000, id="shorter"),
+    pytest.param(2000, 5000, id="at-most-halved"),
+    pytest.param(12000, 10000, id="never-raised"),
+])
+def test_session_expired(ecpcookiejar, age, lifetime):
+    """Check that an expired session updates the lifetime estimate."""
+    domain = "somewhere.test.com"
+    for key in ecpcookiejar._acquired:
+        ecpcookiejar._acquired[key] -= age
+    ecpcookiejar._session_expired(domain)
+    assert ecpcookiejar.session_lifetime(domain) == pytest.approx(
+        lifetime,
+        abs=1,
+    )
+
+
+def test_session_expired_immediately(ecpcookiejar):
+    """Check that a session ending straight away doesn't prevent reuse."""
+    domain = "somewhere.test.com"
+    url = f"https://{domain}"
+    for _ in range(10):
+        ecpcookiejar._session_expired(domain)
+    assert ecpcookiejar.session_lifetime(domain) == (
+        ciecplib_cookies.MIN_SESSION_LIFETIME
+    )
+    # a fresh session cookie is still usable
+    assert ciecplib_cookies.has_session_cookies(ecpcookiejar, url)
+
+
+def _cookie(name, domain="test.com", expires=None):
+    jar = ciecplib_cookies.ECPCookieJar()
+    jar.set(name, "value", domain=domain, expires=expires)
+    return next(iter(jar))
+
+
+def test_max_cookies():
+    """Check that `ECPCookieJar` evicts the least-recently-set cookies."""
+    jar = ciecplib_cookies.ECPCookieJar(
+        max_cookies=3,
+        max_cookies_per_domain=2,
+    )
+    for name, domain in (
+        ("a", "one.test.com"),
+        ("b", "one.test.com"),
+        ("c", "two.test.com"),
+    ):
+        jar.set_cookie(_cookie(name, domain=domain))
+    # re-setting 'a' makes 'b' the oldest cookie for one.test.com
+    jar.set_cookie(_cookie("a", domain="one.test.com"))
+    jar.set_cookie(_cookie("d", domain="one.test.com"))
+    assert sorted(c.name for c in jar) == ["a", "c", "d"]
+    # and 'c' is now the oldest cookie overall
+    jar.set_cookie(_cookie("e", domain="three.test.com"))
+    assert sorted(c.name for c in jar) == ["a", "d", "e"]
+    assert jar.stats() == {
+        "cookies": 3,
+        "domains": 2,
+        "evicted": 2,
+        "expired": 0,
+        "compactions": 0,
+    }
+
+
+def test_max_cookies_session_cookie():
+    """Check that session cookies are evicted last."""
+    jar = ciecplib_cookies.ECPCookieJar(max_cookies_per_domain=2)
+    jar.set_cookie(_cookie("_shibsession_abc"))
+    jar.set_cookie(_cookie("a"))
+    jar.set_cookie(_cookie("b"))
+    assert sorted(c.name for c in jar) == ["_shibsession_abc", "b"]
+    assert ciecplib_cookies.has_session_cookies(jar, "https://test.com")
+
+
+def test_compact():
+    """Check that `ECPCookieJar.compact` removes expired cookies."""
+    jar = ciecplib_cookies.ECPCookieJar(compact_interval=3600)
+    jar.set_cookie(_cookie("old", expires=1))
+    jar.set_cookie(_cookie("new", expires=2**31))
+    jar.set_cookie(_cookie("session"))
+    assert len(jar) == 3
+    assert jar.compact() == 1
+    assert sorted(c.name for c in jar) == ["new", "session"]
+    assert jar.stats()["expired"] == 1
+
+    # check that compaction happens automatically when the interval passes
+    jar.set_cookie(_cookie("old", expires=1))
+    assert "old" in jar
+    jar._last_compact -= 3600
+    jar.set_cookie(_cookie("other"))
+    assert "old" not in jar
+    assert jar.stats()["compactions"] == 2
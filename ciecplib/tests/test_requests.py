@@ -29,3 +29,37 @@ def test_get(requests_mock):
         endpoint="https://test.example.com/SOAP/ECP",
         kerberos=False,
     ).text == "HELLO"
+
+
+def test_get_session_reuse(requests_mock, session_manager):
+    """Check that repeated calls reuse the same `Session`."""
+    requests_mock.get("https://test.example.com", content=b"HELLO")
+    for _ in range(3):
+        ciecplib_requests.get(
+            "https://test.example.com",
+            endpoint="https://test.example.com/SOAP/ECP",
+            kerberos=False,
+        )
+    assert len(session_manager) == 1
+
+
+def test_get_many(requests_mock, session_manager):
+    """Check that `get_many` returns all responses and captures errors."""
+    urls = [f"https://test.example.com/{i}" for i in range(20)]
+    for i, url in enumerate(urls):
+        requests_mock.get(url, content=str(i).encode())
+    bad = "https://bad.example.com"
+    requests_mock.get(bad, exc=ConnectionError)
+
+    results = dict(ciecplib_requests.get_many(
+        urls + [bad],
+        endpoint="https://test.example.com/SOAP/ECP",
+        kerberos=False,
+        max_workers=4,
+        per_host_limit=2,
+    ))
+    assert {url: results[url].text for url in urls} == {
+        url: str(i) for i, url in enumerate(urls)
+    }
+    assert isinstance(results[bad], ConnectionError)
+    assert len(session_manager) == 1
@@ -17,11 +17,17 @@
 
 """Test suite for :mod:`cieclib.sessions`."""
 
+import gc
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from urllib.parse import urlparse
 
 import pytest
 
 from .. import sessions as ciecplib_sessions
+from ..cookies import ECPCookieJar
 
 __author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
 
@@ -55,3 +61,241 @@ class TestSession():
             # or the logger was set back to NOTSET
             or logging.getLogger().getEffectiveLevel() == logging.NOTSET
         )
+
+    @mock.patch(
+        "ciecplib.sessions.get_idp_url",
+        return_value="https://idp.example.com/idp/profile/SAML2/SOAP/ECP",
+    )
+    def test_idp_lazy(self, get_idp_url):
+        """Check that the IdP URL is only resolved when it is needed."""
+        sess = self.TEST_CLASS(idp="Example", kerberos=False)
+        get_idp_url.assert_not_called()
+        for _ in range(2):
+            assert sess.auth.idp == get_idp_url.return_value
+        get_idp_url.assert_called_once_with("Example")
+
+    def test_reuse_cookies_no_idp_lookup(self, requests_mock):
+        """Check that requests with valid cookies don't query the IdP list."""
+        requests_mock.get("https://test.example.com", content=b"HELLO")
+        with self.TEST_CLASS(idp="Example", kerberos=False) as sess:
+            assert sess.get("https://test.example.com").text == "HELLO"
+        assert requests_mock.call_count == 1
+
+    def test_cookiejar_bounds(self):
+        """Check that the session inherits the bounds of a cookie jar."""
+        jar = ECPCookieJar(max_cookies=10, max_cookies_per_domain=2)
+        jar.set("a", "1", domain="test.com")
+        with self.TEST_CLASS(
+            idp="Example",
+            kerberos=False,
+            cookiejar=jar,
+        ) as sess:
+            assert sess.cookies.max_cookies == 10
+            assert sess.cookies.max_cookies_per_domain == 2
+            assert sess.cookies["a"] == "1"
+
+    def test_single_flight_authentication(self, requests_mock):
+        """Check that concurrent redirects only trigger one ECP login."""
+        url = "https://test.example.com/data"
+
+        def _content(request, context):
+            if "_shibsession_test" in request.headers.get("Cookie", ""):
+                context.status_code = 200
+                return b"HELLO"
+            context.status_code = 302
+            context.headers["Location"] = (
+                "https://idp.example.com/SSO?SAMLRequest=abc"
+            )
+            return b""
+
+        requests_mock.get(url, content=_content)
+
+        calls = []
+
+        def _authenticate(session, endpoint=None, url=None, **kwargs):
+            calls.append(url)
+            time.sleep(.1)
+            session.cookies.set(
+                "_shibsession_test",
+                "abc",
+                domain="test.example.com",
+            )
+
+        sess = self.TEST_CLASS(
+            idp="https://example.com/idp/profile/SAML2/SOAP/ECP",
+            kerberos=False,
+        )
+        with mock.patch.object(
+            sess.auth,
+            "_authenticate",
+            side_effect=_authenticate,
+        ), ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(
+                lambda _: sess.get(url).text,
+                range(16),
+            ))
+        assert results == ["HELLO"] * 16
+        assert calls == [url]
+
+
+    def test_single_flight_authentication_per_host(self, requests_mock):
+        """Check that a login to one SP doesn't stand in for another."""
+        urls = [
+            "https://a.example.com/data",
+            "https://b.example.com/data",
+        ]
+        def _content(request, context):
+            host = request.netloc.split(".")[0]
+            if f"_shibsession_{host}" in request.headers.get("Cookie", ""):
+                context.status_code = 200
+                return f"HELLO {host}".encode("utf-8")
+            context.status_code = 302
+            context.headers["Location"] = (
+                "https://idp.example.com/SSO?SAMLRequest=abc"
+            )
+            return b""
+
+        for url in urls:
+            requests_mock.get(url, content=_content)
+
+        calls = []
+
+        def _authenticate(session, endpoint=None, url=None, **kwargs):
+            calls.append(url)
+            time.sleep(.2)  # the other request is sent during this login
+            host = urlparse(url).netloc
+            session.cookies.set(
+                f"_shibsession_{host.split('.')[0]}",
+                "abc",
+                domain=host,
+            )
+
+        sess = self.TEST_CLASS(
+            idp="https://example.com/idp/profile/SAML2/SOAP/ECP",
+            kerberos=False,
+        )
+        with mock.patch.object(
+            sess.auth,
+            "_authenticate",
+            side_effect=_authenticate,
+        ), ThreadPoolExecutor(len(urls)) as pool:
+            results = list(pool.map(
+                lambda i: time.sleep(i * .1) or sess.get(urls[i]).text,
+                range(len(urls)),
+            ))
+        assert results == ["HELLO a", "HELLO b"]
+        assert sorted(calls) == urls
+
+
+class TestSessionManager():
+    TEST_CLASS = ciecplib_sessions.SessionManager
+    IDP = "https://example.com/idp/profile/SAML2/SOAP/ECP"
+
+    def test_get_reuse(self):
+        """Check that sessions are reused for the same parameters."""
+        manager = self.TEST_CLASS()
+        sess = manager.get(idp=self.IDP, kerberos=False)
+        assert isinstance(sess, ciecplib_sessions.Session)
+        assert manager.get(idp=self.IDP, kerberos=False) is sess
+        assert manager.get(
+            idp=self.IDP,
+            kerberos=False,
+            username="albert.einstein",
+        ) is not sess
+        assert len(manager) == 2
+
+    def test_get_cookiejar(self):
+        """Check that sessions using an explicit cookie jar aren't pooled."""
+        manager = self.TEST_CLASS()
+        jar = ciecplib_sessions.ECPCookieJar()
+        sess = manager.get(idp=self.IDP, kerberos=False, cookiejar=jar)
+        jar.set("a", "1", domain="test.com")
+        sess2 = manager.get(idp=self.IDP, kerberos=False, cookiejar=jar)
+        assert sess2 is not sess
+        assert sess2.cookies["a"] == "1"
+        assert len(manager) == 0
+
+    def test_get_ttl(self):
+        """Check that idle sessions expire."""
+        manager = self.TEST_CLASS(ttl=0)
+        sess = manager.get(idp=self.IDP, kerberos=False)
+        assert manager.get(idp=self.IDP, kerberos=False) is not sess
+
+    @mock.patch("ciecplib.sessions.time.monotonic")
+    def test_get_ttl_idle(self, monotonic):
+        """Check that a session idle for longer than the TTL is replaced."""
+        manager = self.TEST_CLASS(ttl=60)
+        monotonic.return_value = 1000.
+        sess = manager.get(idp=self.IDP, kerberos=False)
+        monotonic.return_value = 1059.
+        assert manager.get(idp=self.IDP, kerberos=False) is sess
+        monotonic.return_value = 1119.
+        adapter = sess.get_adapter("https://test.com")
+        with mock.patch.object(adapter, "close") as close:
+            new = manager.get(idp=self.IDP, kerberos=False)
+            assert new is not sess
+            assert len(manager) == 1
+            # the old session may still be in use, so isn't closed...
+            close.assert_not_called()
+            # ...until nothing refers to it
+            del sess
+            gc.collect()
+            close.assert_called_once_with()
+
+    def test_get_lru(self):
+        """Check that the least recently used session is evicted."""
+        manager = self.TEST_CLASS(maxsize=2)
+        a = manager.get(idp=self.IDP, kerberos=False, username="a")
+        b = manager.get(idp=self.IDP, kerberos=False, username="b")
+        assert manager.get(idp=self.IDP, kerberos=False, username="a") is a
+        with mock.patch.object(b, "close") as close:
+            manager.get(idp=self.IDP, kerberos=False, username="c")
+        close.assert_not_called()
+        assert len(manager) == 2
+        assert manager.get(idp=self.IDP, kerberos=False, username="a") is a
+        assert manager.get(idp=self.IDP, kerberos=False, username="b") is not b
+
+    @mock.patch.dict(ciecplib_sessions._KRB5_PRINCIPALS, clear=True)
+    @mock.patch("ciecplib.sessions._krb5_ccache_identity")
+    @mock.patch("ciecplib.sessions._krb5_principal")
+    def test_get_kerberos_principal(self, principal, ccache):
+        """Check that sessions are keyed on the active Kerberos principal."""
+        manager = self.TEST_CLASS()
+        ccache.return_value = ("FILE:/tmp/krb5cc", (1, 1))
+        principal.return_value = "albert.einstein@EXAMPLE.COM"
+        sess = manager.get(idp=self.IDP)
+        assert manager.get(idp=self.IDP) is sess
+        # the principal is only looked up again if the ccache changes
+        principal.return_value = "marie.curie@EXAMPLE.COM"
+        assert manager.get(idp=self.IDP) is sess
+        assert principal.call_count == 1
+        ccache.return_value = ("FILE:/tmp/krb5cc", (1, 2))
+        assert manager.get(idp=self.IDP) is not sess
+        assert principal.call_count == 2
+
+    def test_get_concurrent(self):
+        """Check that sessions are created without holding the lock."""
+        manager = self.TEST_CLASS()
+        created = []
+        session_class = ciecplib_sessions.Session
+
+        def _session(**kwargs):
+            # the lock is free while the session is created
+            assert manager._lock.acquire(blocking=False)
+            manager._lock.release()
+            created.append(session_class(**kwargs))
+            return created[-1]
+
+        with mock.patch.object(
+            ciecplib_sessions,
+            "Session",
+            side_effect=_session,
+        ):
+            sess = manager.get(idp=self.IDP, kerberos=False)
+        assert created == [sess]
+
+    def test_clear(self):
+        manager = self.TEST_CLASS()
+        manager.get(idp=self.IDP, kerberos=False)
+        manager.clear()
+        assert len(manager) == 0
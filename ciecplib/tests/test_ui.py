@@ -0,0 +1,83 @@
+# Copyright (C) 2025 Cardiff University
+#
+# This file is part of ciecplib.
+#
+# ciecplib is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ciecplib is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ciecplib.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for :mod:`ciecplib.ui`."""
+
+import io
+from urllib.parse import urlparse
+from unittest import mock
+
+import pytest
+
+from requests import HTTPError
+
+from .. import ui as ciecplib_ui
+from ..sessions import Session
+
+__author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
+
+
+class _Body(io.BytesIO):
+    """A `BytesIO` that records how many bytes have been read."""
+    nread = 0
+
+    def read(self, *args, **kwargs):
+        data = super().read(*args, **kwargs)
+        self.nread += len(data)
+        return data
+
+    def readinto(self, buffer):
+        n = super().readinto(buffer)
+        self.nread += n
+        return n
+
+
+def _authenticate(self, url=None, **kwargs):
+    """Mock `Session.ecp_authenticate` by just setting a session cookie."""
+    self.cookies.set(
+        "_shibsession_123",
+        "abc",
+        domain=urlparse(url).netloc,
+    )
+
+
+@mock.patch.object(Session, "ecp_authenticate", _authenticate)
+def test_get_cookie(requests_mock):
+    """Check that `get_cookie` doesn't download the content of the URL."""
+    body = _Body(b"x" * 1000000)
+    requests_mock.get("https://test.example.com/big.dat", body=body)
+    cookie = ciecplib_ui.get_cookie(
+        "https://test.example.com/big.dat",
+        endpoint="https://test.example.com/SOAP/ECP",
+        kerberos=False,
+    )
+    assert cookie.name == "_shibsession_123"
+    assert cookie.value == "abc"
+    # the body should not have been read
+    assert not body.nread
+
+
+@mock.patch.object(Session, "ecp_authenticate", _authenticate)
+def test_get_cookie_error(requests_mock):
+    """Check that `get_cookie` raises errors from the target URL."""
+    requests_mock.get("https://test.example.com", status_code=403)
+    with pytest.raises(HTTPError):
+        ciecplib_ui.get_cookie(
+            "https://test.example.com",
+            endpoint="https://test.example.com/SOAP/ECP",
+            kerberos=False,
+        )
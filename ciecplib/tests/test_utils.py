@@ -22,6 +22,7 @@ from pathlib import Path
 from unittest import mock
 
 import pytest
+from requests import ConnectionError as RequestsConnectionError
 
 from .. import utils as ciecplib_utils
 
@@ -75,11 +76,71 @@ def test_get_x509_proxy_path():
     assert ciecplib_utils.get_x509_proxy_path() == Path(path)
 
 
+@mock.patch.dict("os.environ", {"XDG_CACHE_HOME": "/test/cache"})
+def test_get_cache_dir():
+    assert ciecplib_utils.get_cache_dir() == Path("/test/cache/ciecplib")
+
+
 def test_get_idps(requests_mock):
     requests_mock.get("https://idp-list-url", content=RAW_IDP_LIST)
     assert ciecplib_utils.get_idps("https://idp-list-url") == INSTITUTIONS
 
 
+def test_get_idps_cache(requests_mock, cache_dir):
+    """Check that `get_idps` serves a fresh list from the on-disk cache."""
+    requests_mock.get("https://idp-list-url", content=RAW_IDP_LIST)
+    for _ in range(3):
+        assert ciecplib_utils.get_idps("https://idp-list-url") == INSTITUTIONS
+    assert requests_mock.call_count == 1
+    assert len(list(cache_dir.glob("idps-*.json"))) == 1
+
+
+def test_get_idps_cache_revalidate(requests_mock):
+    """Check that `get_idps` revalidates a stale cache entry."""
+    requests_mock.get(
+        "https://idp-list-url",
+        [
+            {"content": RAW_IDP_LIST, "headers": {"ETag": '"abc"'}},
+            {"status_code": 304},
+        ],
+    )
+    for _ in range(2):
+        assert ciecplib_utils.get_idps(
+            "https://idp-list-url",
+            cache_ttl=0,
+        ) == INSTITUTIONS
+    assert requests_mock.call_count == 2
+    assert requests_mock.last_request.headers["If-None-Match"] == '"abc"'
+
+
+def test_get_idps_cache_stale(requests_mock):
+    """Check that `get_idps` uses a stale cache if the server is down."""
+    requests_mock.get(
+        "https://idp-list-url",
+        [
+            {"content": RAW_IDP_LIST},
+            {"exc": RequestsConnectionError},
+        ],
+    )
+    for _ in range(2):
+        assert ciecplib_utils.get_idps(
+            "https://idp-list-url",
+            cache_ttl=0,
+        ) == INSTITUTIONS
+
+
+def test_get_idps_no_cache(requests_mock, cache_dir):
+    """Check that `get_idps(cache=False)` always downloads the list."""
+    requests_mock.get("https://idp-list-url", content=RAW_IDP_LIST)
+    for _ in range(2):
+        assert ciecplib_utils.get_idps(
+            "https://idp-list-url",
+            cache=False,
+        ) == INSTITUTIONS
+    assert requests_mock.call_count == 2
+    assert not cache_dir.exists()
+
+
 @pytest.mark.parametrize("value, krb, result", [
     # direct match for institution
     ("Institution A", False, INST_DICT["Institution A"]),
@@ -140,3 +201,45 @@ def test_get_idp_url_error(requests_mock, inst):
 ))
 def test_preferred_match(matches, out):
     assert ciecplib_utils._preferred_match(matches) == out
+
+
+@pytest.mark.parametrize("value, krb, result", [
+    # exact name match is preferred over a substring match
+    ("Institution A", None, INST_DICT["Institution A"]),
+    ("institution c (BACKUP)", None, INST_DICT["Institution C (backup)"]),
+    # exact hostname match
+    ("login.insta.org", None, INST_DICT["Institution A"]),
+    # kerberos partition
+    ("Institution A", True, INST_DICT["Institution A (Kerberos)"]),
+    ("Institution A", False, INST_DICT["Institution A"]),
+])
+def test_idp_index_match(value, krb, result):
+    index = ciecplib_utils.IdpIndex(INSTITUTIONS)
+    assert len(index) == len(INSTITUTIONS)
+    assert index.match(value, kerberos=krb).url == result
+
+
+def test_idp_index_match_error():
+    index = ciecplib_utils.IdpIndex(INSTITUTIONS)
+    with pytest.raises(ValueError, match="possible matches include"):
+        index.match("Institution")
+
+
+def test_get_idp_index(requests_mock):
+    """Check that `get_idp_index` only rebuilds when the list changes."""
+    requests_mock.get(
+        "https://idp-list-url",
+        [
+            {"content": RAW_IDP_LIST},
+            {"content": RAW_IDP_LIST},
+            {"content": RAW_IDP_LIST.rsplit(b"\n", 1)[0]},
+        ],
+    )
+    first = ciecplib_utils.get_idp_index("https://idp-list-url", cache_ttl=0)
+    assert ciecplib_utils.get_idp_index(
+        "https://idp-list-url",
+        cache_ttl=0,
+    ) is first
+    new = ciecplib_utils.get_idp_index("https://idp-list-url", cache_ttl=0)
+    assert new is not first
+    assert list(new) == INSTITUTIONS[:-1]
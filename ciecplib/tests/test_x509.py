@@ -17,10 +17,14 @@
 
 """Test suite for :mod:`cieclib.x509`."""
 
+import os
 import sys
+import threading
+import time
 from io import StringIO
 from unittest import mock
 
+from cryptography.x509 import KeyUsage
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 
@@ -41,6 +45,22 @@ def test_load_cert(x509, x509_path):
     assert cert == x509
 
 
+def test_load_cert_cache(x509, x509_path, private_key):
+    """Test that `ciecplib.x509.load_cert` only parses changed files."""
+    cert = ciecplib_x509.load_cert(x509_path)
+    with mock.patch("builtins.open") as mock_open:
+        assert ciecplib_x509.load_cert(x509_path) is cert
+    mock_open.assert_not_called()
+
+    # replace the file and check that the new certificate is loaded
+    ciecplib_x509.write_cert(x509_path, x509, private_key, use_proxy=True)
+    new = ciecplib_x509.load_cert(x509_path)
+    assert new != cert
+    assert ciecplib_x509._cert_type(new) == (
+        "RFC 3820 compliant impersonation proxy"
+    )
+
+
 def test_load_pkcs12(x509, private_key):
     """Test that `ciecplib.x509.load_pkcs12` returns equivalent certs and keys."""
     from cryptography.hazmat.primitives.serialization import (
@@ -144,6 +164,42 @@ def test_print_cert_info_display(x509, display, result):
     assert out.strip() == result.strip()
 
 
+def test_print_cert_info_display_lazy(x509):
+    """Test that `print_cert_info` only computes the displayed parameters."""
+    stream = StringIO()
+    summary = ciecplib_x509.CertificateSummary(x509)
+    with mock.patch(
+        "ciecplib.x509._cert_summary",
+        return_value=summary,
+    ), mock.patch(
+        "ciecplib.x509._key_strength",
+    ) as mock_strength:
+        ciecplib_x509.print_cert_info(
+            x509,
+            display=("timeleft",),
+            stream=stream,
+        )
+    assert int(stream.getvalue()) == ciecplib_x509.time_left(x509)
+    mock_strength.assert_not_called()
+    assert summary._text is None
+    assert summary._subject is None
+
+
+def test_certificate_summary(x509):
+    """Test `ciecplib.x509.CertificateSummary`."""
+    summary = ciecplib_x509.CertificateSummary(x509)
+    assert not hasattr(summary, "__dict__")
+    assert summary.subject == summary.issuer == X509_SUBJECT
+    assert summary.type == "end entity credential"
+    assert summary.strength == "2048 bits"
+    assert summary.text.startswith("-----BEGIN CERTIFICATE-----")
+    assert summary.expiry > time.time()
+    # check that the summary is cached per certificate
+    assert ciecplib_x509._cert_summary(x509) is (
+        ciecplib_x509._cert_summary(x509)
+    )
+
+
 @pytest.mark.parametrize("proxy", (False, True))
 def test_write_cert(tmp_path, private_key, x509, proxy):
     path = tmp_path / "509.pem"
@@ -189,3 +245,229 @@ def test_generate_proxy(x509, private_key, limited, ctype):
 
     # check that the cerificate type matches
     assert ciecplib_x509._cert_type(proxy) == ctype
+
+
+@pytest.mark.parametrize("limited, language", [
+    (False, "Inherit all"),
+    (True, ciecplib_x509.PROXY_POLICY_LIMITED),
+])
+def test_get_proxy_cert_info(x509, private_key, limited, language):
+    """Test that the proxyCertInfo of a generated proxy can be parsed."""
+    proxy, _ = ciecplib_x509.generate_proxy(
+        x509,
+        private_key,
+        limited=limited,
+    )
+    assert ciecplib_x509._get_cert_policy_language(proxy) == language
+    pathlen, _, policy = ciecplib_x509._get_proxy_cert_info(proxy)
+    assert pathlen is None
+    assert policy is None
+    # and that a plain certificate doesn't have one
+    with pytest.raises(ciecplib_x509.crypto_x509.ExtensionNotFound):
+        ciecplib_x509._get_proxy_cert_info(x509)
+
+
+@pytest.mark.parametrize("language, ctype", [
+    ("1.3.6.1.5.5.7.21.1", "RFC 3820 compliant impersonation proxy"),
+    ("1.3.6.1.5.5.7.21.2", "RFC 3820 compliant independent proxy"),
+    ("1.3.6.1.4.1.3536.1.1.1.9", "RFC 3820 compliant limited proxy"),
+    ("1.2.3.4", "RFC 3820 compliant restricted proxy"),
+])
+def test_get_cert_type_policy_language(x509, language, ctype):
+    """Test that the proxy type is determined by the policy language."""
+    with mock.patch(
+        "ciecplib.x509._get_proxy_cert_info",
+        return_value=(None, language, None),
+    ):
+        assert ciecplib_x509._get_cert_type(x509, "/CN=123") == ctype
+
+
+def _der(tag, content):
+    """Encode a DER element (for testing)."""
+    length = len(content)
+    if length < 0x80:
+        return bytes((tag, length)) + content
+    size = (length.bit_length() + 7) // 8
+    return bytes((tag, 0x80 | size)) + length.to_bytes(size, "big") + content
+
+
+@pytest.mark.parametrize("oid, encoded", [
+    ("1.3.6.1.5.5.7.21.1", b"+\x06\x01\x05\x05\x07\x15\x01"),
+    ("1.3.6.1.5.5.7.21.2", b"+\x06\x01\x05\x05\x07\x15\x02"),
+    ("1.3.6.1.4.1.3536.1.1.1.9", b"+\x06\x01\x04\x01\x9bP\x01\x01\x01\t"),
+    ("2.999.3", b"\x88\x37\x03"),
+])
+@pytest.mark.parametrize("pathlen", (None, 0, 1, 1000))
+@pytest.mark.parametrize("policy", (None, b"", b"policy", b"x" * 300))
+def test_parse_proxy_cert_info(oid, encoded, pathlen, policy):
+    """Test that `_parse_proxy_cert_info` decodes all valid structures."""
+    proxypolicy = _der(0x06, encoded)
+    if policy is not None:
+        proxypolicy += _der(0x04, policy)
+    data = _der(0x30, proxypolicy)
+    if pathlen is not None:
+        data = _der(0x02, pathlen.to_bytes(2, "big", signed=True)) + data
+    data = _der(0x30, data)
+    assert ciecplib_x509._parse_proxy_cert_info(data) == (
+        pathlen,
+        oid,
+        policy,
+    )
+
+
+@pytest.mark.parametrize("data", [
+    pytest.param(b"", id="empty"),
+    pytest.param(b"0\x02\x30\x00", id="no-language"),
+    pytest.param(
+        b"0\x0c0\x0a\x06\x08+\x06\x01\x05\x05\x07\x15",
+        id="truncated",
+    ),
+    pytest.param(b"0\x040\x02\x06\x00", id="empty-oid"),
+    pytest.param(b"0\x040\x02\x04\x00", id="not-oid"),
+    pytest.param(b"1\x00", id="not-sequence"),
+    pytest.param(b"0\x80", id="bad-length"),
+])
+def test_parse_proxy_cert_info_error(data):
+    """Test that `_parse_proxy_cert_info` rejects invalid data."""
+    with pytest.raises(ValueError):
+        ciecplib_x509._parse_proxy_cert_info(data)
+
+
+def test_keypool(x509, private_key):
+    """Test that :class:`ciecplib.x509.KeyPool` hands out distinct keys."""
+    with ciecplib_x509.KeyPool(size=2, bits=1024, refill=False) as pool:
+        keys = [pool.get(timeout=60) for _ in range(3)]
+        # the third key was generated directly, after the pool emptied
+        assert not pool._keys
+    numbers = {key.private_numbers().d for key in keys}
+    assert len(numbers) == 3
+    assert all(key.key_size == 1024 for key in keys)
+
+    # check that the pool is used by generate_proxy
+    pool = mock.Mock(get=mock.Mock(return_value=keys[0]))
+    proxy, pkey = ciecplib_x509.generate_proxy(
+        x509,
+        private_key,
+        keypool=pool,
+    )
+    assert pkey is keys[0]
+    assert proxy.public_key() == keys[0].public_key()
+
+
+def test_keypool_close():
+    """Test that closing a full `KeyPool` stops its (waiting) workers."""
+    class _KeyPool(ciecplib_x509.KeyPool):
+        def _generate(self):
+            return object()
+
+    pool = _KeyPool(size=1, workers=2)
+    with pool._cond:
+        # the workers fill the pool, then wait for room without polling
+        assert pool._cond.wait_for(lambda: pool._keys, timeout=10)
+    pool.close()
+    for thread in pool._threads:
+        thread.join(5)
+        assert not thread.is_alive()
+    assert not pool._active
+
+
+def test_keypool_get_closed():
+    """Test that `KeyPool.get` doesn't hang if the pool is closed while
+    a key is still being generated in the background.
+    """
+    release = threading.Event()
+
+    class _KeyPool(ciecplib_x509.KeyPool):
+        def _generate(self):
+            if threading.current_thread() in self._threads:
+                release.wait(60)  # a very slow key
+                return "background"
+            return "direct"
+
+    pool = _KeyPool(size=1, refill=False)
+    try:
+        pool.close()
+        assert pool.get() == "direct"
+    finally:
+        release.set()
+
+
+@pytest.mark.parametrize(("key_type", "strength", "encipherment"), [
+    ("p256", "256 bits (secp256r1)", False),
+    ("p384", "384 bits (secp384r1)", False),
+    ("ed25519", "256 bits (Ed25519)", False),
+])
+def test_generate_proxy_key_type(
+    x509,
+    private_key,
+    key_type,
+    strength,
+    encipherment,
+):
+    """Test that :func:`ciecplib.x509.generate_proxy` supports non-RSA keys.
+    """
+    proxy, pkey = ciecplib_x509.generate_proxy(
+        x509,
+        private_key,
+        key_type=key_type,
+    )
+    assert proxy.public_key() == pkey.public_key()
+    usage = proxy.extensions.get_extension_for_class(
+        KeyUsage,
+    ).value
+    assert usage.digital_signature
+    assert usage.key_encipherment is encipherment
+    assert ciecplib_x509._cert_type(proxy) == (
+        "RFC 3820 compliant impersonation proxy"
+    )
+
+    # check that the strength is reported properly
+    stream = StringIO()
+    ciecplib_x509.print_cert_info(
+        proxy,
+        display=["strength"],
+        stream=stream,
+    )
+    assert stream.getvalue().strip() == strength
+
+    # check that we can sign a proxy with the new proxy (and key)
+    proxy2, _ = ciecplib_x509.generate_proxy(proxy, pkey, key_type=key_type)
+    assert proxy2.issuer == proxy.subject
+
+
+def test_generate_proxy_key_type_error(x509, private_key):
+    with pytest.raises(ValueError, match="unsupported key_type 'dsa'"):
+        ciecplib_x509.generate_proxy(x509, private_key, key_type="dsa")
+
+
+def test_write_proxies(tmp_path, x509, private_key):
+    """Test that :func:`ciecplib.x509.write_proxies` writes distinct proxies.
+    """
+    paths = ciecplib_x509.write_proxies(
+        tmp_path / "proxies",
+        x509,
+        private_key,
+        3,
+        max_workers=2,
+        key_type="p256",
+        limited=True,
+    )
+    assert sorted(os.path.basename(path) for path in paths) == [
+        "x509up_p0.pem",
+        "x509up_p1.pem",
+        "x509up_p2.pem",
+    ]
+    proxies = [ciecplib_x509.load_cert(path) for path in paths]
+    assert len({proxy.serial_number for proxy in proxies}) == 3
+    for proxy in proxies:
+        assert proxy.issuer == x509.subject
+        assert ciecplib_x509._cert_type(proxy) == (
+            "RFC 3820 compliant limited proxy"
+        )
+        # check that the proxy is signed by the original key
+        private_key.public_key().verify(
+            proxy.signature,
+            proxy.tbs_certificate_bytes,
+            padding.PKCS1v15(),
+            algorithm=hashes.SHA256(),
+        )
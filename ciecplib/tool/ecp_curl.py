@@ -23,12 +23,25 @@ Persistent cookies acquired during transactions are automatically
 recorded in the cookie file, but session cookies are discarded (unless
 --store-session-cookies is given).
 
+Multiple URLs can be given, in which case each -o/--output option applies
+to the URL in the same position, and all transfers share one session
+(and connection pool); use -Z/--parallel to perform the transfers
+concurrently.
+
 Currently only HTTP GET requests are supported (patches welcome!).
 """
 
+import argparse
+import os
+import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.parser import HeaderParser
 from http.client import HTTPMessage
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
 
 from ..cookies import load_cookiejar
 from ..sessions import Session
@@ -39,6 +52,42 @@ from .utils import (
 
 __author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
 
+DEFAULT_CHUNK_SIZE = 65536
+DEFAULT_PARALLEL_MAX = 50
+
+# extended attribute used to record the ETag of a (partial) download
+ETAG_XATTR = "user.ciecplib.etag"
+
+_CONTENT_RANGE_REGEX = re.compile(r"\Abytes (\d+)-(\d+)/(\d+|\*)\Z")
+
+
+def _offset(value):
+    """Parse the --continue-at argument."""
+    if value == "-":
+        return value
+    try:
+        offset = int(value)
+    except ValueError:
+        offset = -1
+    if offset < 0:
+        raise argparse.ArgumentTypeError(
+            f"invalid offset {value!r}, must be a number of bytes or '-'",
+        )
+    return offset
+
+
+def _positive_int(value):
+    """Parse an argument that must be a positive integer."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            f"invalid value {value!r}, must be a positive integer",
+        )
+    return number
+
 
 def create_parser():
     """Create a command-line argument parser.
@@ -55,7 +104,24 @@ def create_parser():
     )
     parser.add_argument(
         "url",
-        help="the URL to transfer"
+        nargs="*",
+        metavar="URL",
+        help="the URL(s) to transfer",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        metavar="BYTES",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="size of chunks in which to write the response body",
+    )
+    parser.add_argument(
+        "-C",
+        "--continue-at",
+        metavar="OFFSET",
+        type=_offset,
+        help="resume the transfer at OFFSET bytes, use '-' to resume "
+             "from the end of the existing --output file",
     )
     parser.add_argument(
         "-c",
@@ -78,11 +144,36 @@ def create_parser():
         default=None,
         help="HTTP headers to include in the request",
     )
+    parser.add_argument(
+        "-O",
+        "--remote-name",
+        action="store_true",
+        default=False,
+        help="write output to a local file named like the remote file, "
+             "for each URL that doesn't have an --output",
+    )
     parser.add_argument(
         "-o",
         "--output",
         metavar="FILE",
-        help="write to %(metavar)s instead of stdout",
+        action="append",
+        default=None,
+        help="write to %(metavar)s instead of stdout, give once per URL, "
+             "use '-' for stdout",
+    )
+    parser.add_argument(
+        "-Z",
+        "--parallel",
+        action="store_true",
+        default=False,
+        help="perform transfers in parallel",
+    )
+    parser.add_argument(
+        "--parallel-max",
+        metavar="N",
+        type=_positive_int,
+        default=DEFAULT_PARALLEL_MAX,
+        help="maximum number of parallel transfers",
     )
     parser.add_argument(
         "-s",
@@ -91,9 +182,74 @@ def create_parser():
         default=False,
         help="store session cookies in the cookie file"
     )
+    parser.add_argument(
+        "--url-file",
+        metavar="FILE",
+        help="read URLs to transfer from %(metavar)s, one per line, "
+             "use '-' for stdin",
+    )
     return parser
 
 
+def _read_urls(path):
+    """Read URLs from a file, one per line."""
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, "r") as file:
+            lines = file.read().splitlines()
+    return [
+        line.strip() for line in lines
+        if line.strip() and not line.strip().startswith("#")
+    ]
+
+
+def _remote_name(url):
+    """Return the name of the remote file for a URL."""
+    name = os.path.basename(urlparse(url).path)
+    if not name:
+        raise ValueError(f"remote file name for {url!r} has no length")
+    return name
+
+
+def parse_args(parser, args=None):
+    """Parse and validate the command-line arguments.
+
+    Returns
+    -------
+    args : `argparse.Namespace`
+    """
+    args = parser.parse_args(args=args)
+
+    # build the list of URLs
+    if args.url_file:
+        args.url.extend(_read_urls(args.url_file))
+    if not args.url:
+        parser.error("no URL specified")
+
+    # match each URL to an output
+    outputs = args.output or []
+    if len(outputs) > len(args.url):
+        parser.error("more -o/--output options than URLs")
+    args.output = []
+    for i, url in enumerate(args.url):
+        if i < len(outputs):
+            output = None if outputs[i] == "-" else outputs[i]
+        elif args.remote_name:
+            try:
+                output = _remote_name(url)
+            except ValueError as exc:
+                parser.error(str(exc))
+        else:
+            output = None
+        args.output.append(output)
+
+    if args.continue_at == "-" and None in args.output:
+        parser.error("--continue-at - requires --output")
+
+    return args
+
+
 def format_headers(headers):
     """Format headers received on the command line.
 
@@ -116,31 +272,191 @@ def format_headers(headers):
     return dict(HeaderParser(HTTPMessage).parsestr(headerstr))
 
 
-def write(data, path):
+def write(data, path, mode="wb"):
     """Write ``data`` to a file path, or to stdout.
 
     Parameters
     ----------
-    data : `bytes`
-        The data to write.
+    data : `bytes`, `iterable` of `bytes`
+        The data to write, or an iterable of chunks of data
+        (e.g. from :meth:`requests.Response.iter_content`).
 
     path : `str`, `None`
         The target path to write to, or `None` to write to stdout.
+
+    mode : `str`, optional
+        The mode with which to open ``path``, use ``"ab"`` to append.
     """
+    if isinstance(data, bytes):
+        data = (data,)
     if path is None:
         file = sys.stdout.buffer
     else:
-        file = open(path, "wb")
+        file = open(path, mode)
     try:
-        file.write(data)
+        for chunk in data:
+            file.write(chunk)
     finally:
         if path is not None:
             file.close()
+        else:
+            file.flush()
+
+
+def _get_etag(path):
+    """Return the ETag recorded for a partial download, or `None`."""
+    try:
+        return os.getxattr(path, ETAG_XATTR).decode("utf-8")
+    except (AttributeError, OSError):  # not supported, or not set
+        return None
+
+
+def _set_etag(path, etag):
+    """Record the ETag for a download, so that it can be resumed safely."""
+    try:
+        if etag:
+            os.setxattr(path, ETAG_XATTR, etag.encode("utf-8"))
+        else:
+            os.removexattr(path, ETAG_XATTR)
+    except (AttributeError, OSError):  # not supported, or not set
+        pass
+
+
+def transfer(
+    session,
+    url,
+    output=None,
+    headers=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    continue_at=None,
+):
+    """Transfer a URL to a file, or to stdout.
+
+    Parameters
+    ----------
+    session : `ciecplib.Session`
+        The session to use for the request.
+
+    url : `str`
+        The URL to transfer.
+
+    output : `str`, `None`
+        The path to write to, or `None` to write to stdout.
+
+    headers : `dict`, optional
+        Extra HTTP headers to send with the request.
+
+    chunk_size : `int`, optional
+        The size of chunks in which to write the response body.
+
+    continue_at : `int`, `str`, optional
+        The offset (in bytes) at which to resume the transfer,
+        or ``"-"`` to resume from the current size of ``output``.
+        When resuming, the ``Content-Range`` of the response is validated,
+        and the ``ETag`` of the original transfer (if recorded) is sent as
+        ``If-Range`` so that a file that changed on the server is
+        transferred again from the start.
+    """
+    headers = dict(headers or {})
+    offset = 0
+    if continue_at == "-":
+        try:
+            offset = os.path.getsize(output)
+        except OSError:
+            offset = 0
+    elif continue_at:
+        offset = continue_at
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        etag = _get_etag(output) if output else None
+        if etag:
+            headers["If-Range"] = etag
+
+    with session.get(url, headers=headers, stream=True) as resp:
+        # the existing file is already complete
+        if continue_at == "-" and offset and resp.status_code == 416:
+            return
+        resp.raise_for_status()
+
+        mode = "wb"
+        if offset and resp.status_code == 206:
+            match = _CONTENT_RANGE_REGEX.match(
+                resp.headers.get("Content-Range", ""),
+            )
+            if not match or int(match.group(1)) != offset:
+                raise RuntimeError(
+                    f"invalid Content-Range for resumed transfer of {url}: "
+                    f"{resp.headers.get('Content-Range')!r}",
+                )
+            if output is not None:
+                if os.path.getsize(output) < offset:
+                    raise RuntimeError(
+                        f"cannot resume transfer at byte {offset}, "
+                        f"'{output}' is too small",
+                    )
+                os.truncate(output, offset)
+            mode = "ab"
+        elif offset and output is None:
+            raise RuntimeError(
+                f"server does not support byte ranges for {url}, "
+                "cannot resume transfer",
+            )
+        elif continue_at is not None and output is not None:
+            # (re)start the file, recording the ETag so that
+            # this transfer can be resumed later
+            with open(output, "wb"):
+                pass
+            etag = resp.headers.get("ETag")
+            _set_etag(output, None if str(etag).startswith("W/") else etag)
+            mode = "ab"
+
+        write(resp.iter_content(chunk_size=chunk_size), output, mode=mode)
+
+
+def _transfer_all(
+    session,
+    urls,
+    outputs,
+    parallel=False,
+    parallel_max=DEFAULT_PARALLEL_MAX,
+    **kwargs,
+):
+    """Transfer many URLs, optionally in parallel."""
+    if not parallel or len(urls) == 1:
+        for url, output in zip(urls, outputs):
+            transfer(session, url, output=output, **kwargs)
+        return
+
+    # make sure that the connection pool is big enough to share
+    nthreads = min(parallel_max, len(urls))
+    for prefix in ("https://", "http://"):
+        old = session.adapters.get(prefix)
+        if old is not None:
+            old.close()
+        session.mount(prefix, HTTPAdapter(pool_maxsize=nthreads))
+
+    # only write one response to stdout at a time
+    stdout_lock = threading.Lock()
+
+    def _transfer(url, output):
+        if output is None:
+            with stdout_lock:
+                return transfer(session, url, output=output, **kwargs)
+        return transfer(session, url, output=output, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=nthreads) as pool:
+        futures = [
+            pool.submit(_transfer, url, output)
+            for url, output in zip(urls, outputs)
+        ]
+    # raise the first error (if any) once all transfers are complete
+    for future in futures:
+        future.result()
 
 
 def main(args=None):
     parser = create_parser()
-    args = parser.parse_args(args=args)
+    args = parse_args(parser, args=args)
     cookiejar = load_cookiejar(
         args.cookiefile,
         strict=False,
@@ -154,14 +470,17 @@ def main(args=None):
         kerberos=args.kerberos,
         debug=args.debug,
     ) as sess:
-        # GET
-        resp = sess.get(
+        # GET and write
+        _transfer_all(
+            sess,
             args.url,
+            args.output,
+            parallel=args.parallel,
+            parallel_max=args.parallel_max,
             headers=headers,
+            chunk_size=args.chunk_size,
+            continue_at=args.continue_at,
         )
-        resp.raise_for_status()
-        # write
-        write(resp.content, args.output)
         # store session cookies
         if args.store_session_cookies:
             sess.cookies.save(
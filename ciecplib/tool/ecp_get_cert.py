@@ -25,10 +25,13 @@ access management domain.
 
 from ..ui import get_cert
 from ..x509 import (
+    KEY_TYPES,
+    KeyPool,
     check_cert,
     load_cert,
     print_cert_info,
     write_cert,
+    write_proxies,
 )
 from ..utils import DEFAULT_X509_USER_FILE
 from .utils import (
@@ -116,6 +119,21 @@ def create_parser():
         default=277,
         help="lifetime of the certificate"
     )
+    parser.add_argument(
+        "--key-type",
+        choices=KEY_TYPES,
+        default="rsa",
+        help="type of private key to generate for the proxy, "
+             "only used with --proxy",
+    )
+    parser.add_argument(
+        "--num-proxies",
+        type=int,
+        default=0,
+        metavar="N",
+        help="also generate N independent proxies (in parallel) when "
+             "fetching a new certificate, and write them to --proxy-dir",
+    )
     parser.add_argument(
         "-p",
         "--proxy",
@@ -123,6 +141,13 @@ def create_parser():
         default=False,
         help="create RFC 3820 compliant impersonation proxy"
     )
+    parser.add_argument(
+        "--proxy-dir",
+        default=".",
+        metavar="DIR",
+        help="directory in which to write proxies generated with "
+             "--num-proxies",
+    )
     parser.add_argument(
         "-r",
         "--reuse",
@@ -199,26 +224,52 @@ def main(args=None):
 
     # get new certificate
     if not args.reuse:
-        vprint("Fetching certificate...")
-        cert, key = get_cert(
-            endpoint=args.identity_provider,
-            username=getattr(args, "username", None),
-            kerberos=args.kerberos,
-            hours=args.hours,
-            debug=args.debug,
-        )
-
-        # write certificate to a file
-        vprint("Storing certificate...")
-        write_cert(
-            args.file,
-            cert,
-            key,
-            use_proxy=args.proxy,
-            minhours=args.hours,
-        )
+        # the proxy key doesn't depend on the certificate, so start
+        # generating it now, while we wait for the network
+        if args.proxy:
+            keypool = KeyPool(size=1, key_type=args.key_type, refill=False)
+        else:
+            keypool = None
+
+        try:
+            vprint("Fetching certificate...")
+            cert, key = get_cert(
+                endpoint=args.identity_provider,
+                username=getattr(args, "username", None),
+                kerberos=args.kerberos,
+                hours=args.hours,
+                debug=args.debug,
+            )
+
+            # write certificate to a file
+            vprint("Storing certificate...")
+            write_cert(
+                args.file,
+                cert,
+                key,
+                use_proxy=args.proxy,
+                minhours=args.hours,
+                keypool=keypool,
+                key_type=args.key_type,
+            )
+        finally:
+            if keypool is not None:
+                keypool.close()
         vprint("X.509 credential stored")
 
+        # write a batch of independent proxies
+        if args.num_proxies:
+            vprint(f"Generating {args.num_proxies} proxies...")
+            paths = write_proxies(
+                args.proxy_dir,
+                cert,
+                key,
+                args.num_proxies,
+                minhours=args.hours,
+                key_type=args.key_type,
+            )
+            vprint(f"{len(paths)} proxies stored in '{args.proxy_dir}'")
+
     # load the cert from file to print information
     if args.verbose:
         print_cert_info(
@@ -45,6 +45,7 @@ from ..cookies import (
     ECPCookieJar,
     has_session_cookies,
     load_cookiejar,
+    lock_cookiefile,
 )
 from ..ui import get_cookie
 from ..utils import DEFAULT_COOKIE_FILE
@@ -147,36 +148,39 @@ def main(args=None):
         destroy_file(args.cookiefile, "cookie file", verbose=args.verbose)
         return 0
 
-    # load old cookies (erroring if file is malformed only)
-    try:
-        cookiejar = load_cookiejar(args.cookiefile, strict=True)
-    except FileNotFoundError:
-        cookiejar = ECPCookieJar()
-
-    # if we can't or won't reuse cookies, get a new one
-    if not args.reuse or not has_session_cookies(
-            cookiejar,
-            args.target_url,
-    ):
-        vprint("Initialising new session...")
-        with Session(
-            idp=args.identity_provider,
-            cookiejar=cookiejar,
-            username=getattr(args, "username", None),
-            kerberos=args.kerberos,
-        ) as sess:
-            get_cookie(args.target_url, session=sess)
-
-            # write cookies back to the file
-            vprint("Storing cookies...")
-            sess.cookies.save(
-                args.cookiefile,
-                ignore_discard=True,
-                ignore_expires=True,
-            )
-        vprint("Cookie stored in '{0!s}'".format(args.cookiefile))
-    else:
-        vprint("Reusing existing cookies")
+    # hold the lock on the cookie file while we check and refresh it, so
+    # that concurrent calls wait for (and then reuse) a single new cookie
+    with lock_cookiefile(args.cookiefile):
+        # load old cookies (erroring if file is malformed only)
+        try:
+            cookiejar = load_cookiejar(args.cookiefile, strict=True)
+        except FileNotFoundError:
+            cookiejar = ECPCookieJar()
+
+        # if we can't or won't reuse cookies, get a new one
+        if not args.reuse or not has_session_cookies(
+                cookiejar,
+                args.target_url,
+        ):
+            vprint("Initialising new session...")
+            with Session(
+                idp=args.identity_provider,
+                cookiejar=cookiejar,
+                username=getattr(args, "username", None),
+                kerberos=args.kerberos,
+            ) as sess:
+                get_cookie(args.target_url, session=sess)
+
+                # write cookies back to the file
+                vprint("Storing cookies...")
+                sess.cookies.save(
+                    args.cookiefile,
+                    ignore_discard=True,
+                    ignore_expires=True,
+                )
+            vprint("Cookie stored in '{0!s}'".format(args.cookiefile))
+        else:
+            vprint("Reusing existing cookies")
 
     # load the cert from file to print information
     if args.verbose:
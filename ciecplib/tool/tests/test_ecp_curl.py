@@ -17,6 +17,9 @@
 
 """Tests for :mod:`ciecplib.tool.ecp_get_curl`."""
 
+import os
+from unittest import mock
+
 import pytest
 
 from requests import RequestException
@@ -151,3 +154,234 @@ def test_main_headers(capsys, requests_mock, headers, status):
         match="401 Client Error: Unauthorized",
     ):
         ecp_curl.main(args)
+
+
+def test_main_chunk_size(requests_mock, tmp_path):
+    """Test that ``ecp-curl`` streams the response in chunks."""
+    outfile = tmp_path / "out.txt"
+    requests_mock.get(
+        "https://test.example.com",
+        content=b"hello world",
+    )
+    chunks = []
+    real_write = ecp_curl.write
+
+    def _write(data, path, **kwargs):
+        data = list(data)
+        chunks.extend(data)
+        return real_write(data, path, **kwargs)
+
+    with mock.patch.object(ecp_curl, "write", side_effect=_write):
+        ecp_curl.main([
+            "https://test.example.com",
+            "--output", str(outfile),
+            "--chunk-size", "4",
+            "--identity-provider", "https://test.example.com/SOAP/ECP",
+        ])
+    assert chunks == [b"hell", b"o wo", b"rld"]
+    assert outfile.read_text() == "hello world"
+
+
+def range_callback(request, context):
+    """Return a (partial) response based on the ``Range`` request header."""
+    content = b"hello world"
+    context.headers["ETag"] = '"abc"'
+    if "Range" not in request.headers:
+        return content
+    start = int(request.headers["Range"][6:-1])
+    if start >= len(content):
+        context.status_code = 416
+        return b""
+    context.status_code = 206
+    context.headers["Content-Range"] = (
+        f"bytes {start}-{len(content) - 1}/{len(content)}"
+    )
+    return content[start:]
+
+
+@pytest.mark.parametrize(("existing", "status"), [
+    pytest.param(None, 200, id="new"),
+    pytest.param(b"hello ", 206, id="partial"),
+    pytest.param(b"hello world", 416, id="complete"),
+])
+def test_main_continue_at(requests_mock, tmp_path, existing, status):
+    """Test that ``ecp-curl --continue-at -`` resumes a partial transfer."""
+    outfile = tmp_path / "out.txt"
+    if existing is not None:
+        outfile.write_bytes(existing)
+    requests_mock.get("https://test.example.com", content=range_callback)
+    ecp_curl.main([
+        "https://test.example.com",
+        "--output", str(outfile),
+        "--continue-at", "-",
+        "--identity-provider", "https://test.example.com/SOAP/ECP",
+    ])
+    assert outfile.read_text() == "hello world"
+    assert requests_mock.last_request.headers.get("Range") == (
+        f"bytes={len(existing)}-" if existing else None
+    )
+
+
+def test_main_continue_at_no_range_support(requests_mock, tmp_path):
+    """Test that ``ecp-curl -C -`` restarts if the server ignores ranges."""
+    outfile = tmp_path / "out.txt"
+    outfile.write_bytes(b"HELLO ")
+    requests_mock.get("https://test.example.com", content=b"hello world")
+    ecp_curl.main([
+        "https://test.example.com",
+        "--output", str(outfile),
+        "-C", "-",
+        "--identity-provider", "https://test.example.com/SOAP/ECP",
+    ])
+    assert outfile.read_text() == "hello world"
+
+
+def test_main_continue_at_bad_range(requests_mock, tmp_path):
+    """Test that ``ecp-curl -C -`` validates the Content-Range."""
+    outfile = tmp_path / "out.txt"
+    outfile.write_bytes(b"hello ")
+    requests_mock.get(
+        "https://test.example.com",
+        status_code=206,
+        headers={"Content-Range": "bytes 0-10/11"},
+        content=b"hello world",
+    )
+    with pytest.raises(RuntimeError, match="invalid Content-Range"):
+        ecp_curl.main([
+            "https://test.example.com",
+            "--output", str(outfile),
+            "-C", "-",
+            "--identity-provider", "https://test.example.com/SOAP/ECP",
+        ])
+
+
+def test_main_continue_at_stdout_error():
+    """Test that ``ecp-curl -C -`` requires ``--output``."""
+    with pytest.raises(SystemExit):
+        ecp_curl.main([
+            "https://test.example.com",
+            "-C", "-",
+            "--identity-provider", "https://test.example.com/SOAP/ECP",
+        ])
+
+
+def test_main_continue_at_if_range(requests_mock, tmp_path):
+    """Test that ``ecp-curl -C -`` sends the recorded ETag as If-Range."""
+    outfile = tmp_path / "out.txt"
+    requests_mock.get("https://test.example.com", content=range_callback)
+    args = [
+        "https://test.example.com",
+        "--output", str(outfile),
+        "-C", "-",
+        "--identity-provider", "https://test.example.com/SOAP/ECP",
+    ]
+    ecp_curl.main(args)
+    if ecp_curl._get_etag(outfile) is None:
+        pytest.skip("extended attributes not supported")
+    os.truncate(outfile, 4)  # simulate an interrupted transfer
+    ecp_curl.main(args)
+    assert requests_mock.last_request.headers["If-Range"] == '"abc"'
+    assert outfile.read_text() == "hello world"
+
+
+@pytest.mark.parametrize("parallel", [
+    pytest.param([], id="sequential"),
+    pytest.param(["--parallel"], id="parallel"),
+])
+def test_main_multiple_urls(monkeypatch, requests_mock, tmp_path, parallel):
+    """Test that ``ecp-curl`` can transfer many URLs in one call."""
+    for i in range(3):
+        requests_mock.get(
+            f"https://test.example.com/{i}.txt",
+            content=f"hello {i}".encode("utf-8"),
+        )
+    urlfile = tmp_path / "urls"
+    urlfile.write_text(
+        "# comment\n"
+        "https://test.example.com/2.txt\n"
+        "\n",
+    )
+    monkeypatch.chdir(tmp_path)
+    ecp_curl.main([
+        "https://test.example.com/0.txt",
+        "https://test.example.com/1.txt",
+        "--url-file", str(urlfile),
+        "-o", str(tmp_path / "zero"),
+        "--remote-name",
+        "--identity-provider", "https://test.example.com/SOAP/ECP",
+    ] + parallel)
+    assert (tmp_path / "zero").read_text() == "hello 0"
+    assert (tmp_path / "1.txt").read_text() == "hello 1"
+    assert (tmp_path / "2.txt").read_text() == "hello 2"
+
+
+def test_main_parallel_stdout(capsys, requests_mock):
+    """Test that parallel transfers to stdout don't interleave."""
+    urls = [f"https://test.example.com/{i}" for i in range(8)]
+    for i, url in enumerate(urls):
+        requests_mock.get(url, content=str(i).encode("utf-8") * 100)
+    ecp_curl.main(urls + [
+        "--parallel",
+        "--chunk-size", "10",
+        "--identity-provider", "https://test.example.com/SOAP/ECP",
+    ])
+    out, err = capsys.readouterr()
+    assert sorted(out[i:i+100] for i in range(0, len(out), 100)) == [
+        str(i) * 100 for i in range(8)
+    ]
+
+
+def test_main_parallel_error(requests_mock, tmp_path):
+    """Test that parallel transfers all complete before raising errors."""
+    requests_mock.get("https://test.example.com/bad", status_code=404)
+    requests_mock.get("https://test.example.com/good", content=b"good")
+    with pytest.raises(RequestException):
+        ecp_curl.main([
+            "https://test.example.com/bad",
+            "https://test.example.com/good",
+            "-o", str(tmp_path / "bad"),
+            "-o", str(tmp_path / "good"),
+            "--parallel",
+            "--identity-provider", "https://test.example.com/SOAP/ECP",
+        ])
+    assert (tmp_path / "good").read_text() == "good"
+
+
+@pytest.mark.parametrize("args", [
+    pytest.param([], id="no-url"),
+    pytest.param(
+        ["https://test.example.com", "-o", "a", "-o", "b"],
+        id="too-many-outputs",
+    ),
+    pytest.param(["https://test.example.com/", "-O"], id="no-remote-name"),
+    pytest.param(
+        ["https://test.example.com", "--parallel-max", "0"],
+        id="parallel-max-zero",
+    ),
+])
+def test_main_url_errors(args):
+    """Test that ``ecp-curl`` rejects bad URL/output combinations."""
+    with pytest.raises(SystemExit):
+        ecp_curl.main(args + [
+            "--identity-provider", "https://test.example.com/SOAP/ECP",
+        ])
+
+
+def test_transfer_all_closes_adapters(requests_mock):
+    """Test that parallel transfers close the adapters they replace."""
+    urls = [f"https://test.example.com/{i}" for i in range(2)]
+    for url in urls:
+        requests_mock.get(url, content=b"hello")
+    sess = ecp_curl.Session(
+        idp="https://test.example.com/SOAP/ECP",
+        kerberos=False,
+    )
+    old = sess.adapters["https://"]
+    with mock.patch.object(old, "close") as close:
+        ecp_curl._transfer_all(
+            sess,
+            urls,
+            [os.devnull] * len(urls),
+            parallel=True,
+        )
+    close.assert_called_once_with()
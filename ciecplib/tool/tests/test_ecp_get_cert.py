@@ -17,6 +17,7 @@
 
 """Tests for :mod:`ciecplib.tool.ecp_get_cert`."""
 
+import threading
 from unittest import mock
 
 import pytest
@@ -75,3 +76,83 @@ def test_ecp_get_cert_reuse_fail(x509_path, x509, private_key):
         # make sure that it did get reused
         mock_get_cert.assert_called_once()
     assert ciecplib_x509.load_cert(bad) == x509
+
+
+def test_ecp_get_cert_proxy_key_type(tmp_path, x509, private_key):
+    """Check that --key-type is used to generate the proxy key."""
+    x509_path = tmp_path / "x509.pem"
+    with mock.patch(
+        "ciecplib.tool.ecp_get_cert.get_cert",
+        return_value=(x509, private_key),
+    ):
+        ecp_get_cert.main([
+            "--file", str(x509_path),
+            "--identity-provider", "test",
+            "--proxy",
+            "--key-type", "p256",
+        ])
+    proxy = ciecplib_x509.load_cert(x509_path)
+    assert proxy.issuer == x509.subject
+    assert ciecplib_x509._key_strength(proxy.public_key()) == (
+        "256 bits (secp256r1)"
+    )
+
+
+@mock.patch("ciecplib.tool.ecp_get_cert.write_proxies")
+def test_ecp_get_cert_num_proxies(write_proxies, tmp_path, x509, private_key):
+    """Check that --num-proxies writes a batch of proxies."""
+    with mock.patch(
+        "ciecplib.tool.ecp_get_cert.get_cert",
+        return_value=(x509, private_key),
+    ):
+        ecp_get_cert.main([
+            "--file", str(tmp_path / "x509.pem"),
+            "--identity-provider", "test",
+            "--num-proxies", "5",
+            "--proxy-dir", str(tmp_path / "proxies"),
+        ])
+    write_proxies.assert_called_once_with(
+        str(tmp_path / "proxies"),
+        x509,
+        private_key,
+        5,
+        minhours=277,
+        key_type="rsa",
+    )
+
+
+def test_ecp_get_cert_proxy_keypool(tmp_path, x509, private_key):
+    """Check that the proxy key is generated while fetching the certificate.
+    """
+    events = []
+    generating = threading.Event()
+
+    class _KeyPool(ciecplib_x509.KeyPool):
+        def _generate(self):
+            events.append("generate")
+            generating.set()
+            return super()._generate()
+
+    def _get_cert(**kwargs):
+        # key generation must start while the certificate is being
+        # fetched, i.e. before this returns
+        assert generating.wait(10)
+        events.append("get_cert")
+        return x509, private_key
+
+    x509_path = tmp_path / "x509.pem"
+    with mock.patch(
+        "ciecplib.tool.ecp_get_cert.get_cert",
+        side_effect=_get_cert,
+    ), mock.patch(
+        "ciecplib.tool.ecp_get_cert.KeyPool",
+        _KeyPool,
+    ):
+        ecp_get_cert.main([
+            "--file", str(x509_path),
+            "--identity-provider", "test",
+            "--proxy",
+        ])
+    # check that the key was generated by the pool, and only once
+    assert events == ["generate", "get_cert"]
+    assert ciecplib_x509.load_cert(x509_path).issuer == x509.subject
@@ -23,7 +23,10 @@ from unittest import mock
 import pytest
 
 from ... import __version__ as ciecplib_version
-from ...utils import EcpIdentityProvider
+from ...utils import (
+    EcpIdentityProvider,
+    IdpIndex,
+)
 from .. import utils as tools_utils
 
 __author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
@@ -68,11 +71,11 @@ def test_argument_parser_kerberos_defaults(capsys):
 
 
 @mock.patch(
-    "ciecplib.tool.utils.get_idps",
-    return_value=[
+    "ciecplib.tool.utils.get_idp_index",
+    return_value=IdpIndex([
         EcpIdentityProvider("Inst 1", "https://url1", False),
         EcpIdentityProvider("Cardiff University", "https://cardiff", True),
-    ],
+    ]),
 )
 def test_list_idps_action(_, capsys):
     parser = tools_utils.ArgumentParser()
@@ -25,11 +25,12 @@ from operator import attrgetter
 
 from .. import __version__
 from ..cookies import (
+    DEFAULT_SESSION_MARGIN,
     has_session_cookies,
 )
 from ..env import _get_default_idp
 from ..kerberos import find_principal
-from ..utils import get_idps
+from ..utils import get_idp_index
 
 __author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
 
@@ -210,7 +211,7 @@ class ListIdpsAction(argparse.Action):
         )
 
     def __call__(self, parser, namespace, values, option_string=None):
-        idps = get_idps()
+        idps = get_idp_index().idps
         formatter = parser._get_formatter()
         fmt = "{0.name!r:%ss} : {0.url}" % (max(len(i.name) for i in idps) + 2)
         lines = []
@@ -223,7 +224,12 @@ class ListIdpsAction(argparse.Action):
 
 # -- miscellaneous ------------------------------
 
-def reuse_cookies(cookiejar, url, verbose=False):
+def reuse_cookies(
+        cookiejar,
+        url,
+        verbose=False,
+        margin=DEFAULT_SESSION_MARGIN,
+):
     """Determine if a cookiejar has session cookies we can reuse.
 
     Parameters
@@ -237,6 +243,10 @@ def reuse_cookies(cookiejar, url, verbose=False):
     verbose : `bool`, optional
         if `True`, print verbose output
 
+    margin : `float`, optional
+        the minimum number of seconds that should remain before the
+        predicted expiry of the session cookie
+
     Returns
     -------
     cookiejar : `ligo.org.cookies.ECPCookieJar`, `NoneType`
@@ -248,7 +258,7 @@ def reuse_cookies(cookiejar, url, verbose=False):
     """
     if verbose:
         print("Validating existing cookies...", end=" ")
-    reuse = has_session_cookies(cookiejar, url)
+    reuse = has_session_cookies(cookiejar, url, margin=margin)
     if verbose and reuse:
         print("OK")
     elif verbose:
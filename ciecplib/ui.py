@@ -82,10 +82,11 @@ def get_cookie(
             url=url,
         )
 
-        # make the original request, it may introduce more cookies
+        # make the original request, it may introduce more cookies,
+        # but don't download the content, we only want the headers
         if url != DEFAULT_SP_URL:
-            resp = sess.get(url=url)
-            resp.raise_for_status()
+            with sess.get(url=url, stream=True) as resp:
+                resp.raise_for_status()
 
         # extract the shibsession cookie for the SP:
         #   we do this by searching for all cookies associated with
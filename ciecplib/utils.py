@@ -15,15 +15,22 @@
 # You should have received a copy of the GNU General Public License
 # along with ciecplib.  If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
+import json
 import os
 import random
 import re
 import string
+import tempfile
+import time
 from collections import namedtuple
 from pathlib import Path
+from urllib.parse import urlparse
 
 import requests
 
+from .env import _get_idplist_cache_ttl
+
 __author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
 
 
@@ -61,6 +68,26 @@ def get_x509_proxy_path():
     return _tmpfile("x509up_")
 
 
+def get_cache_dir():
+    """Return the default directory for ciecplib's cached data.
+
+    This is ``$XDG_CACHE_HOME/ciecplib`` if ``XDG_CACHE_HOME`` is set,
+    otherwise ``~/.cache/ciecplib`` (Unix) or
+    ``%LOCALAPPDATA%\\ciecplib`` (Windows).
+
+    Returns
+    -------
+    path : `pathlib.Path`
+    """
+    if os.getenv("XDG_CACHE_HOME"):
+        base = Path(os.environ["XDG_CACHE_HOME"])
+    elif os.name == "nt":
+        base = Path(os.getenv("LOCALAPPDATA", tempfile.gettempdir()))
+    else:
+        base = Path.home() / ".cache"
+    return base / "ciecplib"
+
+
 DEFAULT_COOKIE_FILE = str(get_ecpcookie_path())
 DEFAULT_X509_USER_FILE = str(get_x509_proxy_path())
 
@@ -96,25 +123,121 @@ EcpIdentityProvider = namedtuple(
 )
 
 
-def get_idps(url=DEFAULT_IDPLIST_URL, timeout=10):
-    """Download the list of known ECP IdPs from the given URL.
+def _idplist_cache_path(url):
+    """Return the path of the cache file for the IdP list at ``url``."""
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+    return get_cache_dir() / "idps-{}.json".format(digest)
 
-    The output is a `list` of `EcpIdentityProvider` objects.
 
-    Some institutions may have two entries if they also support Kerberos.
+def _read_idplist_cache(path):
+    """Read a cached IdP list entry, returning `None` on any failure."""
+    try:
+        with open(str(path), "r") as fobj:
+            entry = json.load(fobj)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or "content" not in entry:
+        return None
+    return entry
 
-    Parameters
-    ----------
-    url : `str`
-        the URL of the IDP list file
+
+def _write_idplist_cache(path, entry):
+    """Atomically write a cached IdP list entry, ignoring any failures.
+
+    Failing to write the cache should never stop the user from
+    authenticating, so all `OSError` exceptions are ignored.
+    """
+    tmp = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w",
+            dir=str(path.parent),
+            suffix=".tmp",
+            delete=False,
+        ) as tmp:
+            json.dump(entry, tmp)
+        os.replace(tmp.name, str(path))
+    except OSError:
+        if tmp is not None:
+            try:
+                os.unlink(tmp.name)
+            except OSError:
+                pass
+
+
+def _download_idplist(url, timeout=10):
+    """Download the raw IdP list from the given URL."""
+    resp = requests.get(url, timeout=timeout)
+    resp.raise_for_status()
+    return resp.content.decode("utf-8")
+
+
+def _get_idplist(url, timeout=10, cache=True, cache_ttl=None):
+    """Return the raw content of the IdP list, using the on-disk cache.
+
+    A cached copy that is younger than ``cache_ttl`` seconds is returned
+    without contacting the server, otherwise the cached copy is
+    revalidated using the ``ETag`` and ``Last-Modified`` headers of the
+    original response.
+    If the server cannot be contacted, a stale cached copy is returned
+    in preference to raising an exception.
     """
+    if not cache:
+        return _download_idplist(url, timeout=timeout)
+
+    if cache_ttl is None:
+        cache_ttl = _get_idplist_cache_ttl()
+
+    try:
+        path = _idplist_cache_path(url)
+    except (KeyError, RuntimeError):  # no home directory
+        return _download_idplist(url, timeout=timeout)
+
+    # use the cached copy if it is fresh enough
+    entry = _read_idplist_cache(path)
+    if entry is not None and entry.get("url") != url:
+        entry = None
+    if (
+        entry is not None
+        and time.time() - entry.get("fetched", 0) < cache_ttl
+    ):
+        return entry["content"]
+
+    # otherwise ask the server if anything has changed
+    headers = {}
+    if entry is not None and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry is not None and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        resp = requests.get(url, headers=headers, timeout=timeout)
+        resp.raise_for_status()
+    except requests.RequestException:
+        if entry is not None:  # serve stale content rather than fail
+            return entry["content"]
+        raise
+
+    if resp.status_code != 304 or entry is None:
+        entry = {
+            "url": url,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content": resp.content.decode("utf-8"),
+        }
+    entry["fetched"] = time.time()
+    _write_idplist_cache(path, entry)
+    return entry["content"]
+
+
+def _parse_idplist(content):
+    """Parse the raw IdP list into a `list` of `EcpIdentityProvider`."""
     idps = list()
-    for line in requests.get(
-        url,
-        timeout=timeout,
-        stream=True,
-    ).iter_lines():
-        url, inst = line.decode("utf-8").strip().split(" ", 1)
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        url, inst = line.split(" ", 1)
         idps.append(EcpIdentityProvider(
             inst,
             url,
@@ -123,29 +246,67 @@ def get_idps(url=DEFAULT_IDPLIST_URL, timeout=10):
     return idps
 
 
-def _match(value, idplist, attr, kerberos=None):
-    return [
-        inst for inst in idplist
-        if value in getattr(inst, attr).lower()
-        and kerberos in (None, inst.iskerberos)
-    ]
+def get_idps(url=DEFAULT_IDPLIST_URL, timeout=10, cache=True, cache_ttl=None):
+    """Download the list of known ECP IdPs from the given URL.
+
+    The output is a `list` of `EcpIdentityProvider` objects.
+
+    Some institutions may have two entries if they also support Kerberos.
+
+    The list is cached on disk (see `get_cache_dir`), and the cached copy
+    is used without contacting the server for ``cache_ttl`` seconds,
+    after which it is revalidated with a conditional request.
+
+    Parameters
+    ----------
+    url : `str`
+        the URL of the IDP list file
+
+    timeout : `float`, optional
+        the number of seconds to wait for the server to respond
+
+    cache : `bool`, optional
+        if `True` (default) use the on-disk cache of the IdP list,
+        otherwise always download the list
+
+    cache_ttl : `float`, optional
+        the number of seconds for which a cached list is considered fresh,
+        defaults to the value of the ``ECP_IDPLIST_CACHE_TTL`` environment
+        variable, or one day
+    """
+    return _parse_idplist(_get_idplist(
+        url,
+        timeout=timeout,
+        cache=cache,
+        cache_ttl=cache_ttl,
+    ))
 
 
-def _preferred_match(matches):
+def _preferred_match(matches, isprimary=None, issecondary=None):
     """Attempt to select a preferred match from a list of many.
 
     This only prefers institutions names that don't end with a
     numeric suffix (or end with ' 1'), mainly to distinguish
     between multiple entries like ``'Cardiff University 1'`` and
     ``'Cardiff University 2'``
+
+    ``isprimary`` and ``issecondary`` can be given as functions that
+    take an `EcpIdentityProvider` and return `True` if it is marked as
+    the primary (or secondary) entry for an institution, by default
+    the name of each entry is checked against a regular expression.
     """
     if not len(matches) > 1:
         return matches
+    if isprimary is None:
+        def isprimary(idp):
+            return bool(_PRIMARY_SUFFIX_REGEX.search(idp.name))
+    if issecondary is None:
+        def issecondary(idp):
+            return bool(_SECONDARY_SUFFIX_REGEX.search(idp.name))
     # find all names marked as 'primary' or similar
-    primaries = [x for x in matches if _PRIMARY_SUFFIX_REGEX.search(x.name)]
+    primaries = [x for x in matches if isprimary(x)]
     # find all names marked as 'backup' or similar
-    secondaries = [x for x in matches if
-                   _SECONDARY_SUFFIX_REGEX.search(x.name)]
+    secondaries = [x for x in matches if issecondary(x)]
     # if only one primary, return that
     if len(primaries) == 1:
         return primaries[:1]
@@ -156,38 +317,181 @@ def _preferred_match(matches):
     return matches
 
 
-def _match_institution(value, institutions, kerberos=None):
-    value = str(value).lower()
+class IdpIndex:
+    """An index of ECP Identity Providers optimised for lookups.
 
-    # try and match the institution name
-    matches = _preferred_match(
-        _match(value, institutions, "name", kerberos=kerberos),
-    )
-    if len(matches) == 1:
-        return matches.pop()
+    All of the normalisation (lower-casing, hostname parsing, and
+    primary/secondary classification) needed to match an institution
+    name or URL is done once when the index is created.
+
+    Parameters
+    ----------
+    idps : `list` of `EcpIdentityProvider`
+        the list of IdPs to index
+    """
+    def __init__(self, idps):
+        self.idps = tuple(idps)
+
+        # exact (lower-case) name and hostname lookups
+        self._names = {}
+        self._hosts = {}
+
+        # (name, url, idp) tuples for substring matches, partitioned
+        # by kerberos support
+        self._entries = {None: [], True: [], False: []}
+
+        for idp in self.idps:
+            name = idp.name.lower()
+            url = idp.url.lower()
+            self._names.setdefault(name, []).append(idp)
+            host = urlparse(url).hostname
+            if host:
+                self._hosts.setdefault(host, []).append(idp)
+            entry = (name, url, idp)
+            self._entries[None].append(entry)
+            self._entries[bool(idp.iskerberos)].append(entry)
+
+        # primary/secondary classification for preferred matches
+        self._primary = frozenset(
+            idp for idp in self.idps if _PRIMARY_SUFFIX_REGEX.search(idp.name)
+        )
+        self._secondary = frozenset(
+            idp for idp in self.idps
+            if _SECONDARY_SUFFIX_REGEX.search(idp.name)
+        )
+
+    def __len__(self):
+        return len(self.idps)
+
+    def __iter__(self):
+        return iter(self.idps)
+
+    @staticmethod
+    def _exact(lookup, value, kerberos):
+        return [
+            idp for idp in lookup.get(value, ())
+            if kerberos in (None, idp.iskerberos)
+        ]
 
-    # otherwise match the IdP URL
-    if _URL_REGEX.match(value):
-        umatches = _preferred_match(
-            _match(value, institutions, "url", kerberos=kerberos),
+    def _preferred(self, matches):
+        return _preferred_match(
+            matches,
+            isprimary=self._primary.__contains__,
+            issecondary=self._secondary.__contains__,
         )
-        if len(umatches) == 1:
-            return umatches.pop()
-        matches = matches or umatches or []
-
-    # if we found multiple matches, print them to help the user
-    if len(matches):
-        raise ValueError(
-            "failed to identify unique IdP URL for {0!r}, possible matches "
-            "include:\n"
-            "{1}".format(
-                value,
-                "\n".join(map("{0.name!r}: {0.url}".format, matches)),
-            ),
+
+    def match(self, value, kerberos=None):
+        """Return the unique IdP matching an institution name or URL.
+
+        Parameters
+        ----------
+        value : `str`
+            the name of an institution, or a URL for the endpoint, or
+            part thereof
+
+        kerberos : `bool`, optional
+            if `True` (`False`) only match IdPs that do (do not) support
+            Kerberos authentication, if `None` (default) match any IdP
+
+        Returns
+        -------
+        idp : `EcpIdentityProvider`
+            the matching identity provider
+
+        Raises
+        ------
+        ValueError
+            if there isn't a unique match for either the institution name,
+            or the IdP URL
+        """
+        value = str(value).lower()
+        if kerberos is not None:
+            kerberos = bool(kerberos)
+        entries = self._entries[kerberos]
+
+        # try and match the institution name
+        matches = self._exact(self._names, value, kerberos)
+        if len(matches) == 1:
+            return matches[0]
+        matches = self._preferred(
+            [idp for name, _, idp in entries if value in name],
         )
+        if len(matches) == 1:
+            return matches[0]
+
+        # otherwise match the IdP URL
+        if _URL_REGEX.match(value):
+            umatches = self._exact(self._hosts, value, kerberos)
+            if len(umatches) == 1:
+                return umatches[0]
+            umatches = self._preferred(
+                [idp for _, url, idp in entries if value in url],
+            )
+            if len(umatches) == 1:
+                return umatches[0]
+            matches = matches or umatches or []
+
+        # if we found multiple matches, print them to help the user
+        if len(matches):
+            raise ValueError(
+                "failed to identify unique IdP URL for {0!r}, possible "
+                "matches include:\n"
+                "{1}".format(
+                    value,
+                    "\n".join(map("{0.name!r}: {0.url}".format, matches)),
+                ),
+            )
+
+        # otherwise just fail
+        raise ValueError("failed to identify IdP URLs for {0!r}".format(value))
+
+
+_IDP_INDEX_CACHE = {}
+
+
+def get_idp_index(
+    url=DEFAULT_IDPLIST_URL,
+    timeout=10,
+    cache=True,
+    cache_ttl=None,
+):
+    """Return an `IdpIndex` for the list of known ECP IdPs.
+
+    The index is built once per list and reused for as long as the
+    content of the list (see `get_idps`) does not change.
 
-    # otherwise just fail
-    raise ValueError("failed to identify IdP URLs for {0!r}".format(value))
+    Parameters
+    ----------
+    url : `str`
+        the URL of the IDP list file
+
+    timeout, cache, cache_ttl
+        see `get_idps`
+
+    Returns
+    -------
+    index : `IdpIndex`
+        the index of identity providers
+    """
+    content = _get_idplist(
+        url,
+        timeout=timeout,
+        cache=cache,
+        cache_ttl=cache_ttl,
+    )
+    cached = _IDP_INDEX_CACHE.get(url)
+    if cached is None or cached[0] != content:
+        cached = _IDP_INDEX_CACHE[url] = (
+            content,
+            IdpIndex(_parse_idplist(content)),
+        )
+    return cached[1]
+
+
+def _match_institution(value, institutions, kerberos=None):
+    if not isinstance(institutions, IdpIndex):
+        institutions = IdpIndex(institutions)
+    return institutions.match(value, kerberos=kerberos)
 
 
 def get_idp_url(url_or_name, idplist_url=DEFAULT_IDPLIST_URL, kerberos=False):
@@ -227,9 +531,8 @@ def get_idp_url(url_or_name, idplist_url=DEFAULT_IDPLIST_URL, kerberos=False):
     if _ECP_ENDPOINT_REGEX.match(url_or_name):
         return url_or_name
     # otherwise match against CILogon's registered list
-    idps = get_idps(url=idplist_url)
-    institution = _match_institution(url_or_name, idps, kerberos=kerberos)
-    return institution.url
+    index = get_idp_index(url=idplist_url)
+    return index.match(url_or_name, kerberos=kerberos).url
 
 
 # -- misc utilities -----------------------------------------------------------
@@ -19,25 +19,68 @@
 
 import calendar
 import datetime
+import multiprocessing
+import os
 import shutil
 import sys
 import tempfile
+import threading
 import time
+from collections import (
+    OrderedDict,
+    deque,
+)
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    wait,
+)
+from functools import lru_cache
+from itertools import islice
 
 from cryptography import x509 as crypto_x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import (
+    ec,
+    ed25519,
+)
 from cryptography.hazmat.primitives.asymmetric.rsa import generate_private_key
 from cryptography.hazmat.primitives.serialization import (
     Encoding,
     NoEncryption,
     PrivateFormat,
+    load_pem_private_key,
 )
 
 __author__ = "Duncan Macleod <duncan.macleod@ligo.org>"
 
 PROXY_CERT_INFO_EXT_OID = crypto_x509.ObjectIdentifier("1.3.6.1.5.5.7.1.14")
 
+#: Proxy policy languages (RFC 3820 section 3.8, and Globus)
+PROXY_POLICY_INHERIT_ALL = "1.3.6.1.5.5.7.21.1"
+PROXY_POLICY_INDEPENDENT = "1.3.6.1.5.5.7.21.2"
+PROXY_POLICY_LIMITED = "1.3.6.1.4.1.3536.1.1.1.9"
+
+# DER tags used in the proxyCertInfo extension
+_DER_INTEGER = 0x02
+_DER_OCTET_STRING = 0x04
+_DER_OID = 0x06
+_DER_SEQUENCE = 0x30
+
+#: Supported types of proxy private key
+KEY_TYPES = (
+    "rsa",
+    "p256",
+    "p384",
+    "ed25519",
+)
+
+_EC_CURVES = {
+    "p256": ec.SECP256R1,
+    "p384": ec.SECP384R1,
+}
+
 # backport short names for cryptography < 2.5
 _NAMEOID_TO_NAME = {
     crypto_x509.NameOID.COMMON_NAME: "CN",
@@ -57,9 +100,32 @@ def _parse_unix_time(asn1time):
     return calendar.timegm(asn1time.get_datetime().timetuple())
 
 
+# cache of parsed certificate files:
+#     {path: ((inode, mtime_ns, size), cert)}
+_CERT_CACHE = OrderedDict()
+_CERT_CACHE_SIZE = 16
+# cache of certificate summaries: {cert: CertificateSummary}
+_CERT_SUMMARIES = OrderedDict()
+_CERT_SUMMARIES_SIZE = 64
+_CACHE_LOCK = threading.Lock()
+
+
+def _cache_put(cache, size, key, value):
+    """Store a value in a bounded LRU cache."""
+    with _CACHE_LOCK:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+
 def load_cert(path):
     """Load an X.509 certificate from file containing PEM-encoded data.
 
+    Parsed certificates are cached in memory, and the file is only
+    re-read if it has changed (its inode, modification time, or size
+    are different).
+
     Parameters
     ----------
     path : `str`, `pathlib.Path`
@@ -70,11 +136,22 @@ def load_cert(path):
     cert : `cryptography.x509.Certificate`
         the parsed certificate
     """
-    with open(str(path), "rb") as fobj:
-        return crypto_x509.load_pem_x509_certificate(
+    path = os.path.abspath(str(path))
+    stat = os.stat(path)
+    identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _CACHE_LOCK:
+        cached = _CERT_CACHE.get(path)
+        if cached is not None and cached[0] == identity:
+            _CERT_CACHE.move_to_end(path)
+            return cached[1]
+
+    with open(path, "rb") as fobj:
+        cert = crypto_x509.load_pem_x509_certificate(
             fobj.read(),
             backend=default_backend(),
         )
+    _cache_put(_CERT_CACHE, _CERT_CACHE_SIZE, path, (identity, cert))
+    return cert
 
 
 def load_pkcs12(raw, password):
@@ -136,8 +213,102 @@ def time_left(cert):
     cert : `cryptography.x509.Certificate`
         The certificate to inspect.
     """
-    expiry = _not_valid_after(cert).timetuple()
-    return max(0, int(calendar.timegm(expiry) - time.time()))
+    expiry = _cert_summary(cert).expiry
+    return max(0, int(expiry - time.time()))
+
+
+class CertificateSummary:
+    """Summary of the interesting attributes of an X.509 certificate.
+
+    Each attribute is computed when it is first accessed, and then stored,
+    so that callers that only need (e.g.) the expiry time don't pay for
+    parsing names, extensions, or PEM-encoding the certificate.
+
+    Parameters
+    ----------
+    cert : `cryptography.x509.Certificate`
+        the certificate to summarise
+    """
+    __slots__ = (
+        "cert",
+        "_subject",
+        "_issuer",
+        "_type",
+        "_strength",
+        "_expiry",
+        "_text",
+    )
+
+    def __init__(self, cert):
+        self.cert = cert
+        self._subject = None
+        self._issuer = None
+        self._type = None
+        self._strength = None
+        self._expiry = None
+        self._text = None
+
+    @property
+    def subject(self):
+        """The subject of the certificate, as a string."""
+        if self._subject is None:
+            self._subject = _x509_name_str(self.cert.subject)
+        return self._subject
+
+    @property
+    def issuer(self):
+        """The issuer of the certificate, as a string."""
+        if self._issuer is None:
+            self._issuer = _x509_name_str(self.cert.issuer)
+        return self._issuer
+
+    @property
+    def type(self):
+        """The type of the certificate, e.g. ``'end entity credential'``."""
+        if self._type is None:
+            self._type = _get_cert_type(self.cert, self.subject)
+        return self._type
+
+    @property
+    def strength(self):
+        """A description of the strength of the certificate's public key."""
+        if self._strength is None:
+            self._strength = _key_strength(self.cert.public_key())
+        return self._strength
+
+    @property
+    def expiry(self):
+        """The expiry time of the certificate, as a Unix time."""
+        if self._expiry is None:
+            self._expiry = calendar.timegm(
+                _not_valid_after(self.cert).timetuple(),
+            )
+        return self._expiry
+
+    @property
+    def text(self):
+        """The PEM-encoded text of the certificate."""
+        if self._text is None:
+            self._text = self.cert.public_bytes(
+                encoding=Encoding.PEM,
+            ).decode("utf-8").strip()
+        return self._text
+
+
+def _cert_summary(cert):
+    """Return the (cached) `CertificateSummary` for the given certificate."""
+    with _CACHE_LOCK:
+        try:
+            summary = _CERT_SUMMARIES[cert]
+        except KeyError:
+            pass
+        else:
+            _CERT_SUMMARIES.move_to_end(cert)
+            return summary
+
+    summary = CertificateSummary(cert)
+    _cache_put(_CERT_SUMMARIES, _CERT_SUMMARIES_SIZE, cert, summary)
+    return summary
 
 
 def _x509_name_str(obj):
@@ -192,8 +363,12 @@ def check_cert(cert, hours=1, proxy=None, rfc3820=True):
 
 def _cert_type(x509):
     """Return the type of the given x509 certificate object."""
+    return _cert_summary(x509).type
+
+
+def _get_cert_type(x509, subject):
+    """Determine the type of the given x509 certificate object."""
     # parse name entry as common name
-    subject = _x509_name_str(x509.subject)
     ntype, name = subject.rsplit("/", 1)[-1].split("=", 1)
 
     # if name entry is not 'common name' then EEC
@@ -207,32 +382,176 @@ def _cert_type(x509):
 
     # get policy language
     try:
-        policy = _get_cert_policy_language(x509)
+        language = _get_proxy_cert_info(x509)[1]
     except crypto_x509.ExtensionNotFound:
         return "end entity credential"
     except ValueError:  # no policy language
         return "unidentified proxy"
-    else:
-        if policy == "1.3.6.1.4.1.3536.1.1.1.9":
-            return "RFC 3820 compliant limited proxy"
-        if policy == "Inherit all":
-            return "RFC 3820 compliant impersonation proxy"
-        return "RFC 3820 compliant restricted proxy"
+    if language == PROXY_POLICY_LIMITED:
+        return "RFC 3820 compliant limited proxy"
+    if language == PROXY_POLICY_INHERIT_ALL:
+        return "RFC 3820 compliant impersonation proxy"
+    if language == PROXY_POLICY_INDEPENDENT:
+        return "RFC 3820 compliant independent proxy"
+    return "RFC 3820 compliant restricted proxy"
 
 
 def _get_cert_policy_language(x509):
-    """Parse the policy language from the proxyCertInfo extension.
+    """Return the policy language from the proxyCertInfo extension.
+
+    Returns
+    -------
+    language : `str`
+        ``'Inherit all'`` for impersonation proxies, otherwise the
+        dotted-string OID of the policy language
+
+    Raises
+    ------
+    cryptography.x509.ExtensionNotFound
+        if the certificate doesn't have a proxyCertInfo extension
 
-    This is a terrible hack because pyca/cryptography doesn't actually support
-    the proxyCertInfo extension.
+    ValueError
+        if the proxyCertInfo extension cannot be parsed
+    """
+    language = _get_proxy_cert_info(x509)[1]
+    if language == PROXY_POLICY_INHERIT_ALL:
+        return "Inherit all"
+    return language
+
+
+def _get_proxy_cert_info(x509):
+    """Parse the proxyCertInfo extension of a certificate.
+
+    pyca/cryptography doesn't support the proxyCertInfo extension,
+    so this decodes the raw DER value, see `_parse_proxy_cert_info`.
     """
     ext = x509.extensions.get_extension_for_oid(PROXY_CERT_INFO_EXT_OID)
-    for line in ext.value.value.split():
-        if line.endswith(b"+\x06\x01\x05\x05\x07\x15\x01"):
-            return "Inherit all"
-        if line.endswith(b"+\x06\x01\x04\x01\x9bP\x01\x01\x01"):
-            return "1.3.6.1.4.1.3536.1.1.1.9"
-    raise ValueError("no policy language found in cert")
+    return _parse_proxy_cert_info(ext.value.value)
+
+
+@lru_cache(maxsize=64)
+def _parse_proxy_cert_info(data):
+    """Decode a DER-encoded RFC 3820 ``ProxyCertInfo`` extension value.
+
+    In practice only a handful of distinct values are ever seen, so the
+    results are cached.
+
+    The structure is::
+
+        ProxyCertInfo ::= SEQUENCE {
+            pCPathLenConstraint  INTEGER (0..MAX) OPTIONAL,
+            proxyPolicy          ProxyPolicy }
+
+        ProxyPolicy ::= SEQUENCE {
+            policyLanguage  OBJECT IDENTIFIER,
+            policy          OCTET STRING OPTIONAL }
+
+    Parameters
+    ----------
+    data : `bytes`
+        the DER-encoded extension value
+
+    Returns
+    -------
+    path_length : `int`, `None`
+        the path length constraint, or `None` if not given
+
+    language : `str`
+        the dotted-string OID of the policy language
+
+    policy : `bytes`, `None`
+        the policy, or `None` if not given
+
+    Raises
+    ------
+    ValueError
+        if ``data`` is not a valid ``ProxyCertInfo`` structure
+    """
+    tag, start, end = _der_header(data, 0, len(data))
+    if tag != _DER_SEQUENCE or end != len(data):
+        raise ValueError("proxyCertInfo is not a DER SEQUENCE")
+
+    # pCPathLenConstraint
+    path_length = None
+    tag, pos, stop = _der_header(data, start, end)
+    if tag == _DER_INTEGER:
+        if pos == stop:
+            raise ValueError("empty pCPathLenConstraint")
+        path_length = int.from_bytes(data[pos:stop], "big", signed=True)
+        tag, pos, stop = _der_header(data, stop, end)
+    if tag != _DER_SEQUENCE or stop != end:
+        raise ValueError("proxyPolicy is not a DER SEQUENCE")
+
+    # proxyPolicy
+    tag, pos, oidend = _der_header(data, pos, stop)
+    if tag != _DER_OID:
+        raise ValueError("no policy language found in proxyCertInfo")
+    language = _der_oid_str(data, pos, oidend)
+    policy = None
+    if oidend < stop:
+        tag, pos, oidend = _der_header(data, oidend, stop)
+        if tag != _DER_OCTET_STRING or oidend != stop:
+            raise ValueError("invalid policy in proxyCertInfo")
+        policy = bytes(data[pos:oidend])
+    return path_length, language, policy
+
+
+def _der_header(data, pos, end):
+    """Read the tag and length of the DER element starting at ``pos``.
+
+    Returns
+    -------
+    tag : `int`
+        the (single-byte) tag of the element
+
+    start, stop : `int`
+        the offsets of the start and end of the element contents
+    """
+    if pos + 2 > end:
+        raise ValueError("truncated DER element")
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:  # long form
+        nbytes = length & 0x7f
+        if not nbytes or pos + nbytes > end:
+            raise ValueError("invalid DER length")
+        length = 0
+        for _ in range(nbytes):
+            length = (length << 8) | data[pos]
+            pos += 1
+    if pos + length > end:
+        raise ValueError("truncated DER element")
+    return tag, pos, pos + length
+
+
+def _der_oid_str(data, pos, end):
+    """Decode the contents of a DER OBJECT IDENTIFIER as a dotted string."""
+    if pos == end or data[end - 1] & 0x80:
+        raise ValueError("invalid DER OBJECT IDENTIFIER")
+    arcs = []
+    value = 0
+    for i in range(pos, end):
+        byte = data[i]
+        value = (value << 7) | (byte & 0x7f)
+        if byte & 0x80:
+            continue
+        if not arcs:  # the first byte encodes the first two arcs
+            first = min(value // 40, 2)
+            arcs.append(first)
+            value -= first * 40
+        arcs.append(value)
+        value = 0
+    return ".".join(map(str, arcs))
+
+
+def _key_strength(pkey):
+    """Return a description of the strength of a public key."""
+    if isinstance(pkey, ed25519.Ed25519PublicKey):
+        return "256 bits (Ed25519)"
+    if isinstance(pkey, ec.EllipticCurvePublicKey):
+        return f"{pkey.curve.key_size} bits ({pkey.curve.name})"
+    return f"{pkey.key_size} bits"
 
 
 def print_cert_info(
@@ -264,38 +583,242 @@ def print_cert_info(
     """
     if display is None:
         display = []
-    # parse parameters of certificate
-    pkey = x509.public_key()
-    remaining = time_left(x509)
-    if "timeleft" in display:  # if plaintext, print seconds
-        timeleft = str(max(-1, int(remaining)))
-    elif remaining:  # otherwise format nicely
-        timeleft = str(datetime.timedelta(seconds=remaining))
-    else:
-        timeleft = "0:00:00 [EXPIRED]"
+    summary = _cert_summary(x509)
+
+    def _timeleft():
+        remaining = time_left(x509)
+        if "timeleft" in display:  # if plaintext, print seconds
+            return str(max(-1, int(remaining)))
+        if remaining:  # otherwise format nicely
+            return str(datetime.timedelta(seconds=remaining))
+        return "0:00:00 [EXPIRED]"
+
+    # only compute the parameters that are actually displayed
     params = {
-        "subject": _x509_name_str(x509.subject),
-        "issuer": _x509_name_str(x509.issuer),
-        "type": _cert_type(x509),
-        "strength": f"{pkey.key_size} bits",
-        "path": path,
-        "timeleft": timeleft,
+        "subject": lambda: summary.subject,
+        "issuer": lambda: summary.issuer,
+        "type": lambda: _cert_type(x509),
+        "strength": lambda: summary.strength,
+        "path": lambda: path,
+        "timeleft": _timeleft,
+        "text": lambda: "\n" + summary.text,
     }
-    if verbose or "text" in display:
-        params["text"] = "\n" + x509.public_bytes(
-            encoding=Encoding.PEM,
-        ).decode("utf-8").strip()
 
     # use chose specific attributes, so just print them in plain text
     if display:
         for attr in display:
-            print(params[attr].strip(), file=stream)
-    else:
-        for attr in params:
-            print(f"{attr:9s}: {params[attr]}", file=stream)
+            print(params[attr]().strip(), file=stream)
+        return
+    if not verbose:
+        params.pop("text")
+    for attr in params:
+        print(f"{attr:9s}: {params[attr]()}", file=stream)
+
+
+def _generate_key(bits=2048, key_type="rsa"):
+    """Generate a new private key.
+
+    ``bits`` is only used for RSA keys.
+    """
+    if key_type == "rsa":
+        return generate_private_key(
+            public_exponent=65537,
+            key_size=bits,
+            backend=default_backend(),
+        )
+    if key_type == "ed25519":
+        return ed25519.Ed25519PrivateKey.generate()
+    try:
+        curve = _EC_CURVES[key_type]
+    except KeyError:
+        raise ValueError(
+            f"unsupported key_type '{key_type}', "
+            f"choose one of: {', '.join(KEY_TYPES)}",
+        )
+    return ec.generate_private_key(curve(), backend=default_backend())
 
 
-def write_cert(path, cert, key, use_proxy=False, minhours=168):
+def _key_usage(key_type="rsa"):
+    """Return the `KeyUsage` extension for a proxy with the given key type.
+    """
+    return crypto_x509.KeyUsage(
+        digital_signature=True,
+        content_commitment=False,
+        # RSA keys can encrypt, EC keys can agree, Ed25519 can only sign
+        key_encipherment=key_type == "rsa",
+        data_encipherment=key_type == "rsa",
+        key_agreement=key_type in _EC_CURVES,
+        key_cert_sign=False,
+        crl_sign=False,
+        encipher_only=False,
+        decipher_only=False,
+    )
+
+
+def _signing_algorithm(key):
+    """Return the hash algorithm to use when signing with a private key.
+    """
+    if isinstance(key, ed25519.Ed25519PrivateKey):
+        return None  # Ed25519 doesn't use a separate hash
+    return hashes.SHA256()
+
+
+class KeyPool:
+    """A pool of private keys generated in the background.
+
+    Generating a new RSA key is the slowest part of creating a proxy
+    certificate, so a `KeyPool` can be used to generate keys ahead of
+    time in background threads, to be handed out by `KeyPool.get`.
+
+    Parameters
+    ----------
+    size : `int`, optional
+        the number of keys to keep ready
+
+    bits : `int`, optional
+        the number of bits (size) of each RSA key
+
+    key_type : `str`, optional
+        the type of key to generate, one of `KEY_TYPES`
+
+    workers : `int`, optional
+        the number of threads to use to generate keys
+
+    refill : `bool`, optional
+        if `True` (default) generate new keys to replace those that are
+        taken from the pool, otherwise generate ``size`` keys and stop
+
+    Examples
+    --------
+    >>> with KeyPool(size=8) as pool:
+    ...     for cert, key in certs:
+    ...         proxy, proxykey = generate_proxy(cert, key, keypool=pool)
+    """
+    def __init__(
+            self,
+            size=4,
+            bits=2048,
+            key_type="rsa",
+            workers=1,
+            refill=True,
+    ):
+        if key_type not in KEY_TYPES:
+            raise ValueError(
+                f"unsupported key_type '{key_type}', "
+                f"choose one of: {', '.join(KEY_TYPES)}",
+            )
+        self.size = size
+        self.bits = bits
+        self.key_type = key_type
+        self.refill = refill
+        # keys ready to be handed out, guarded by (and waited on using)
+        # the condition, which is notified whenever a key is added or
+        # taken, a worker finishes, or the pool is closed
+        self._keys = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._active = workers
+        self._lock = threading.Lock()
+        self._claimed = 0
+        self._threads = [
+            threading.Thread(
+                target=self._fill,
+                name=f"ciecplib-keypool-{i}",
+                daemon=True,
+            ) for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _claim(self):
+        """Claim the right to generate one more key, if not refilling."""
+        if self.refill:
+            return True
+        with self._lock:
+            if self._claimed >= self.size:
+                return False
+            self._claimed += 1
+            return True
+
+    def _fill(self):
+        """Generate keys until the pool is closed (or full, if not refilling).
+        """
+        try:
+            while not self._stopped and self._claim():
+                key = self._generate()
+                with self._cond:
+                    while len(self._keys) >= self.size and not self._stopped:
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    self._keys.append(key)
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def _generate(self):
+        return _generate_key(bits=self.bits, key_type=self.key_type)
+
+    def get(self, timeout=None):
+        """Return a private key from the pool.
+
+        If the pool is empty, this waits for the next key to be generated
+        in the background, or generates one directly if the background
+        generation has finished.
+
+        Parameters
+        ----------
+        timeout : `float`, optional
+            the maximum number of seconds to wait for a background key,
+            after which a key is generated directly
+
+        Returns
+        -------
+        key
+            a new private key (RSA, EC, or Ed25519)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._keys:
+                    key = self._keys.popleft()
+                    self._cond.notify_all()  # make room for another
+                    return key
+                # don't wait for keys that will never come
+                if self._stopped or not self._active:
+                    break
+                wait = None
+                if deadline is not None:
+                    wait = deadline - time.monotonic()
+                    if wait <= 0:
+                        break
+                self._cond.wait(wait)
+        return self._generate()
+
+    def close(self):
+        """Stop generating keys in the background."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+
+def write_cert(
+        path,
+        cert,
+        key,
+        use_proxy=False,
+        minhours=168,
+        keypool=None,
+        key_type="rsa",
+):
     """Write a PKCS12 certificate archive to file in X509 format.
 
     Parameters
@@ -313,26 +836,49 @@ def write_cert(path, cert, key, use_proxy=False, minhours=168):
     minhours : `int`, optional
         the minimum duration of the proxy certificate, only used if
         `proxy=True` is given
+
+    keypool : `KeyPool`, optional
+        a pool of pre-generated keys to use for the proxy certificate,
+        only used if `proxy=True` is given
+
+    key_type : `str`, optional
+        the type of private key to generate for the proxy certificate,
+        one of `KEY_TYPES`, only used if `proxy=True` is given
     """
     if use_proxy:
         # we will store the original certificate as part of the signing chain
         chain = [cert.public_bytes(encoding=Encoding.PEM)]
         # generate a self-signed proxy
-        cert, key = generate_proxy(cert, key, minhours=minhours)
+        cert, key = generate_proxy(
+            cert,
+            key,
+            minhours=minhours,
+            keypool=keypool,
+            key_type=key_type,
+        )
     else:
         chain = []
+    _write_pem(path, cert, key, chain)
+
+
+def _key_pem(key):
+    """Serialise a private key in (unencrypted) PEM format."""
+    return key.private_bytes(
+        encoding=Encoding.PEM,
+        format=PrivateFormat.PKCS8,
+        encryption_algorithm=NoEncryption(),
+    )
 
+
+def _write_pem(path, cert, key, chain=()):
+    """Write a certificate, its key, and a signing chain to a PEM file."""
     # write the cert, key pair, and the signing chain (if any)
     blocks = [
         # the cert
         cert.public_bytes(encoding=Encoding.PEM),
         # the private key associated with the cert's public key
-        key.private_bytes(
-            encoding=Encoding.PEM,
-            format=PrivateFormat.PKCS8,
-            encryption_algorithm=NoEncryption(),
-        ),
-    ] + chain
+        _key_pem(key),
+    ] + list(chain)
 
     with tempfile.NamedTemporaryFile(delete=False) as tmp:
         # write cert and key to temporary location
@@ -344,7 +890,15 @@ def write_cert(path, cert, key, use_proxy=False, minhours=168):
         shutil.move(tmp.name, str(path))
 
 
-def generate_proxy(cert, key, minhours=168, limited=False, bits=2048):
+def generate_proxy(
+        cert,
+        key,
+        minhours=168,
+        limited=False,
+        bits=2048,
+        keypool=None,
+        key_type="rsa",
+):
     """Generate a proxy certificate based on a certificate.
 
     Parameters
@@ -364,22 +918,31 @@ def generate_proxy(cert, key, minhours=168, limited=False, bits=2048):
 
     bits : `int`
         The number of bits (size) to use for the private key used to sign
-        the proxy certificate.
+        the proxy certificate, ignored if ``keypool`` is given.
+
+    keypool : `KeyPool`, optional
+        A pool of pre-generated keys from which to take the proxy key,
+        in which case ``key_type`` is taken from the pool.
+
+    key_type : `str`
+        The type of private key to generate, one of `KEY_TYPES`;
+        elliptic-curve keys are much faster to generate than RSA keys.
 
     Returns
     -------
     proxycert : `cryptography.X509.Certificate`
         The proxy certificate.
 
-    proxykey : `cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey`
-        The RSA private key used to sign the proxy certificate.
+    proxykey
+        The private key (RSA, EC, or Ed25519) used to sign the proxy
+        certificate.
     """
     # generate a new key pair with which to sign the proxy
-    proxy_private_key = generate_private_key(
-        public_exponent=65537,
-        key_size=bits,
-        backend=default_backend(),
-    )
+    if keypool is None:
+        proxy_private_key = _generate_key(bits=bits, key_type=key_type)
+    else:
+        proxy_private_key = keypool.get()
+        key_type = keypool.key_type
     proxy_public_key = proxy_private_key.public_key()
 
     # create a serial number for the proxy
@@ -400,17 +963,7 @@ def generate_proxy(cert, key, minhours=168, limited=False, bits=2048):
     extensions = [crypto_x509.Extension(
         crypto_x509.KeyUsage.oid,
         True,
-        crypto_x509.KeyUsage(
-            digital_signature=True,
-            content_commitment=False,
-            key_encipherment=True,
-            data_encipherment=True,
-            key_agreement=False,
-            key_cert_sign=False,
-            crl_sign=False,
-            encipher_only=False,
-            decipher_only=False,
-        )
+        _key_usage(key_type),
     )]
     if limited:
         proxyinfoext = crypto_x509.UnrecognizedExtension(
@@ -439,8 +992,164 @@ def generate_proxy(cert, key, minhours=168, limited=False, bits=2048):
     ).add_extension(proxyinfoext, critical=True)
     proxy = builder.sign(
         private_key=key,
-        algorithm=hashes.SHA256(),
+        algorithm=_signing_algorithm(key),
         backend=default_backend(),
     )
 
     return proxy, proxy_private_key
+
+
+def _load_pem_private_key(data):
+    """Load a private key from PEM data that we wrote ourselves.
+
+    RSA key validation is skipped (where supported), since it takes longer
+    than generating a new key.
+    """
+    try:
+        return load_pem_private_key(
+            data,
+            None,
+            backend=default_backend(),
+            unsafe_skip_rsa_key_validation=True,
+        )
+    except TypeError:  # cryptography < 39
+        return load_pem_private_key(data, None, backend=default_backend())
+
+
+@lru_cache(maxsize=4)
+def _load_signer(cert_pem, key_pem):
+    """Load (once per process) the certificate and key to sign proxies.
+    """
+    return (
+        crypto_x509.load_pem_x509_certificate(
+            cert_pem,
+            backend=default_backend(),
+        ),
+        load_pem_private_key(key_pem, None, backend=default_backend()),
+    )
+
+
+def _generate_proxy_pem(cert_pem, key_pem, kwargs):
+    """Generate a proxy from PEM data, returning PEM data.
+
+    This is used by `generate_proxies` to pass certificates and keys
+    to and from other processes.
+    """
+    cert, key = _load_signer(cert_pem, key_pem)
+    proxy, proxykey = generate_proxy(cert, key, **kwargs)
+    return proxy.public_bytes(encoding=Encoding.PEM), _key_pem(proxykey)
+
+
+def generate_proxies(cert, key, n, max_workers=None, **kwargs):
+    """Generate many proxy certificates in parallel.
+
+    Each proxy is generated (with its own key) by `generate_proxy` in a
+    pool of processes, and the results are yielded as they complete.
+
+    Parameters
+    ----------
+    cert : `cryptography.X509.Certificate`
+        The certificate object.
+
+    key : `cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey`
+        The RSA key object used to sign the original certificate.
+
+    n : `int`
+        The number of proxies to generate.
+
+    max_workers : `int`, optional
+        The number of processes to use, defaults to the number of CPUs.
+
+    **kwargs
+        Other keyword arguments are passed to `generate_proxy`.
+
+    Yields
+    ------
+    proxycert : `cryptography.X509.Certificate`
+        A proxy certificate.
+
+    proxykey
+        The private key used to sign the proxy certificate.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, n))
+    cert_pem = cert.public_bytes(encoding=Encoding.PEM)
+    key_pem = _key_pem(key)
+
+    # use 'spawn' to avoid forking a (possibly multi-threaded) process
+    pool_kw = {}
+    if sys.version_info >= (3, 7):  # older versions don't have mp_context
+        pool_kw["mp_context"] = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, **pool_kw) as pool:
+        # keep a bounded number of tasks in flight
+        tasks = (
+            (_generate_proxy_pem, cert_pem, key_pem, kwargs)
+            for _ in range(n)
+        )
+        pending = {
+            pool.submit(*task) for task in islice(tasks, 2 * max_workers)
+        }
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for task in islice(tasks, len(done)):
+                    pending.add(pool.submit(*task))
+                for future in done:
+                    proxy_pem, proxykey_pem = future.result()
+                    yield (
+                        crypto_x509.load_pem_x509_certificate(
+                            proxy_pem,
+                            backend=default_backend(),
+                        ),
+                        _load_pem_private_key(proxykey_pem),
+                    )
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def write_proxies(directory, cert, key, n, prefix="x509up_p", **kwargs):
+    """Generate many proxy certificates and write each to a file.
+
+    Each file has the same format as written by `write_cert` with
+    ``use_proxy=True``.
+
+    Parameters
+    ----------
+    directory : `str`, `pathlib.Path`
+        the directory in which to write the files, which is created if
+        needed
+
+    cert : `cryptography.X509.Certificate`
+        the certificate object
+
+    key : `cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey`
+        the RSA key object used to sign the original certificate
+
+    n : `int`
+        the number of proxies to generate
+
+    prefix : `str`, optional
+        the prefix for each file name, the files are named
+        ``<prefix><index>.pem``
+
+    **kwargs
+        other keyword arguments are passed to `generate_proxies`
+
+    Returns
+    -------
+    paths : `list` of `str`
+        the paths of the files that were written
+    """
+    os.makedirs(str(directory), exist_ok=True)
+    chain = [cert.public_bytes(encoding=Encoding.PEM)]
+    width = len(str(n - 1))
+    paths = []
+    for i, (proxy, proxykey) in enumerate(
+        generate_proxies(cert, key, n, **kwargs),
+    ):
+        path = os.path.join(str(directory), f"{prefix}{i:0{width}d}.pem")
+        _write_pem(path, proxy, proxykey, chain)
+        paths.append(path)
+    return paths